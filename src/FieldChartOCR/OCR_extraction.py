@@ -1,14 +1,75 @@
 #Extract OCR Text for ChartExcel Dataset
 import os
 import json
-from paddleocr import PaddleOCR,draw_ocr
+import argparse
+import threading
+import multiprocessing as mp
+from queue import Queue
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import orjson
+#ONNX Runtime backend for the det/cls/rec models, falling back to Paddle inference
+try:
+	from rapidocr_onnxruntime import RapidOCR
+	HAS_RAPIDOCR = True
+except ImportError:
+	from _ocr_singleton import get_ocr
+	HAS_RAPIDOCR = False
 from tqdm import tqdm
 
-ocr = PaddleOCR(use_angle_cls=True, lang='en', use_gpu=False, ocr_version="PP-OCRv3", enable_mkldnn=True)
+#per-process OCR engine, built lazily by _init_worker
+ocr = None
+use_cls = True
 
-def extract_ocr(chart_data_path):
+def _init_worker(cpu_threads, cls=True):
+	global ocr, use_cls
+	use_cls = cls
+	if ocr is not None:
+		return
+	#the OCR engine does its own threading
+	cv2.setNumThreads(1)
+	if HAS_RAPIDOCR:
+		ocr = RapidOCR(det_use_cuda=False, cls_use_cuda=False, rec_use_cuda=False, intra_op_num_threads=cpu_threads)
+	else:
+		ocr = get_ocr(use_angle_cls=use_cls, lang='en', use_gpu=False, ocr_version="PP-OCRv3", enable_mkldnn=True, cpu_threads=cpu_threads, det_limit_side_len=960)
+
+def _run_ocr(img):
+	if HAS_RAPIDOCR:
+		result, _ = ocr(img, use_cls=use_cls)
+		#keep PaddleOCR's [box, (text, score)] layout for the result files
+		return [[box, (text, score)] for box, text, score in (result or [])]
+	return ocr.ocr(img, cls=use_cls)
+
+def _worker(imgs):
+	#the OCR engines take one image per call, so a batch is run back to back in the worker
+	return [_run_ocr(img) for img in imgs]
+
+def _reader(tasks, q_decoded):
+	#decode stage: each image is decoded once here and handed to OCR as an ndarray
+	for full_img_path, dest_path in tasks:
+		img = cv2.imread(full_img_path, cv2.IMREAD_COLOR)
+		if img is None:
+			print(f"Warning: Could not load {full_img_path}")
+		#unreadable images still go through the queue (as None) so they are counted in the progress bar
+		q_decoded.put((dest_path, img))
+	q_decoded.put(None)
+
+def _write_results(dest_paths, future, pbar):
+	#write stage: wait on one OCR batch and dump its results to disk; a failed batch raises here
+	for dest_path, ocr_texts in zip(dest_paths, future.result()):
+		#images without text get an empty result too, so a resumed run skips them
+		#orjson writes bytes directly and handles Paddle's numpy boxes
+		with open(dest_path, "wb") as f:
+			f.write(orjson.dumps(ocr_texts or [], option=orjson.OPT_SERIALIZE_NUMPY))
+	pbar.update(len(dest_paths))
+
+def extract_ocr(chart_data_path, workers=1, batch=8, queue_size=32, force=False, cls=True):
 	chart_image_path = f"{chart_data_path}/images"
 	annotation_files = os.listdir(f'{chart_data_path}/annotations')
+	#split the cores between workers so the MKLDNN threads do not oversubscribe
+	cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+	cv2.setNumThreads(1)
 
 	for a in annotation_files:
 		current_split = a.split('.')[0].split('_')[-1]
@@ -24,34 +85,72 @@ def extract_ocr(chart_data_path):
 		with open(current_annotation_path, 'r') as f:
 			current_chart_annotation = json.load(f)
 
-
-		#iterate through images
-		for img_info in tqdm(current_chart_annotation['images']):
+		#collect the images that still need OCR; one listing instead of a stat per image
+		done = set() if force else set(os.listdir(tgt_dir))
+		tasks = []
+		for img_info in current_chart_annotation['images']:
 			filename = img_info['file_name']
 			img_id = img_info['id']
 			full_img_path = f'{chart_image_split_path}/{filename}'
-			
-			ocr_texts = ocr.ocr(full_img_path, cls=True)
-			if len(ocr_texts) > 0:
-				dest_path = f"{tgt_dir}/{img_id}.json"
-				with open(dest_path, "w") as f:
-					json.dump(ocr_texts, f)
+			if f"{img_id}.json" in done:
+				continue
+			dest_path = f"{tgt_dir}/{img_id}.json"
+			tasks.append((full_img_path, dest_path))
+
+		#decode -> OCR -> write pipeline; the bounded queue and in-flight window apply back-pressure
+		q_decoded = Queue(maxsize=queue_size)
+		pbar = tqdm(total=len(tasks))
+		reader = threading.Thread(target=_reader, args=(tasks, q_decoded), daemon=True)
+		reader.start()
+
+		#Paddle is not fork-safe so the OCR workers are spawned
+		with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+				initializer=_init_worker, initargs=(cpu_threads, cls)) as executor:
+			#results are written from this thread, in submission order, so OCR errors surface here
+			pending = deque()
+			dest_paths, imgs = [], []
+			while True:
+				item = q_decoded.get()
+				if item is not None and item[1] is None:
+					pbar.update(1)
+				elif item is not None:
+					dest_paths.append(item[0])
+					imgs.append(item[1])
+				#submit when the batch is full, and flush the remainder at the end
+				if len(imgs) >= batch or (item is None and imgs):
+					pending.append((dest_paths, executor.submit(_worker, imgs)))
+					dest_paths, imgs = [], []
+					while len(pending) > queue_size:
+						_write_results(*pending.popleft(), pbar)
+				if item is None:
+					break
+			while pending:
+				_write_results(*pending.popleft(), pbar)
+		reader.join()
+		pbar.close()
 				
 
 if __name__ == "__main__":
-	data_path = '/dvmm-filer2/projects/mingyang/semafor/chart_table/data'
+	parser = argparse.ArgumentParser(description="Extract OCR text for the ChartExcel dataset")
+	parser.add_argument("--data_path", type=str, default='/dvmm-filer2/projects/mingyang/semafor/chart_table/data')
+	parser.add_argument("--workers", type=int, default=1, help="Number of OCR worker processes")
+	parser.add_argument("--batch", type=int, default=8, help="Number of images sent to a worker at once")
+	parser.add_argument("--force", action="store_true", help="Re-run OCR on images that already have results")
+	parser.add_argument("--no-cls", dest="cls", action="store_false", help="Skip the angle classifier for axis-aligned charts")
+	args = parser.parse_args()
+
+	data_path = args.data_path
 	bar_path = f'{data_path}/bar'
 	pie_path = f'{data_path}/pie'
 	line_path = f'{data_path}/line'
     
 	print("Extracting the Table Information from Pie Images")
-	extract_ocr(pie_path)
+	extract_ocr(pie_path, args.workers, args.batch, force=args.force, cls=args.cls)
 
 	print("Extracting the Table Information from Bar Images")
-	extract_ocr(bar_path)
+	extract_ocr(bar_path, args.workers, args.batch, force=args.force, cls=args.cls)
 
 	print("Extracting the Table Information from Line Images")
-	extract_ocr(line_path)
+	extract_ocr(line_path, args.workers, args.batch, force=args.force, cls=args.cls)
 
 
-	
\ No newline at end of file
@@ -1,11 +1,11 @@
-from paddleocr import PaddleOCR,draw_ocr
+from _ocr_singleton import get_ocr
 # Paddleocr supports Chinese, English, French, German, Korean and Japanese.
 # You can set the parameter `lang` as `ch`, `en`, `fr`, `german`, `korean`, `japan`
 # to switch the language model in order.
-ocr = PaddleOCR(use_angle_cls=True, lang='en', use_gpu=False) # need to run only once to download and load model into memory
+ocr = get_ocr(use_angle_cls=False, lang='en', use_gpu=False, ocr_version="PP-OCRv3", enable_mkldnn=True) # shared instance, loaded once per process
 #img_path = './OCR_temp.png'
 img_path = '/dvmm-filer2/projects/mingyang/semafor/chart_table/data/piedata(1008)/pie/images/test2019/f447ffede2ef85e73a191f8c1ed3f9df_c3RhdGxpbmtzLm9lY2Rjb2RlLm9yZwk5Mi4yNDMuMjMuMTM3.XLS-0-0.png'
-result = ocr.ocr(img_path, cls=True)
+result = ocr.ocr(img_path, cls=False) # only boxes and text are read, so the angle classifier is skipped
 word_infos = []
 for i, line in enumerate(result):
 	word_info = {}
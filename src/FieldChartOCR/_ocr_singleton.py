@@ -0,0 +1,16 @@
+#Shared PaddleOCR instance for the OCR scripts
+from functools import lru_cache
+import numpy as np
+from paddleocr import PaddleOCR
+
+@lru_cache(maxsize=1)
+def get_ocr(**kwargs):
+	"""Build PaddleOCR once per process and warm it up.
+
+	Calls with the same keyword arguments share one instance, so the
+	det/cls/rec models are only loaded the first time.
+	"""
+	ocr = PaddleOCR(**kwargs)
+	#run a blank image through so the MKLDNN kernels are compiled before the first real call
+	ocr.ocr(np.zeros((32, 32, 3), dtype=np.uint8), cls=kwargs.get('use_angle_cls', False))
+	return ocr
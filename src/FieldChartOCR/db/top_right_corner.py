@@ -57,8 +57,9 @@ class TopRightCorner(DETECTION):
         self._load_coco_data()
 
     def _load_data(self):
-        if not os.path.exists("./cache"):
-            os.makedirs("./cache")
+        cache_dir = os.path.dirname(self._cache_file)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
         print("loading from cache file: {}".format(self._cache_file))
         if not os.path.exists(self._cache_file):
             print("No cache file found...")
@@ -15,15 +15,23 @@ from __future__ import annotations
 
 import argparse
 import csv
+import io
 import json
-import random
 from dataclasses import dataclass, asdict
 from pathlib import Path
 from typing import Dict, List, Sequence, Tuple
 
+import numpy as np
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 
 # Pools of labels to keep charts varied and realistic.
-SINGLE_SERIES_CATEGORY_POOLS: Sequence[Sequence[str]] = (
+SINGLE_SERIES_CATEGORY_POOLS: Tuple[Tuple[str, ...], ...] = (
     ("Lion", "Zebra", "Bear", "Tiger", "Snake", "Giraffe", "Hippo"),
     ("Solar", "Wind", "Hydro", "Nuclear", "Geothermal", "Biomass"),
     ("Q1", "Q2", "Q3", "Q4"),
@@ -56,7 +64,7 @@ SINGLE_SERIES_CATEGORY_POOLS: Sequence[Sequence[str]] = (
     ("Server", "Client", "Database", "Router", "Switch"),
 )
 
-GROUP_PRIMARY_LABELS: Sequence[Sequence[str]] = (
+GROUP_PRIMARY_LABELS: Tuple[Tuple[str, ...], ...] = (
     ("Green", "Blue", "Yellow", "Red", "Purple"),
     ("Project A", "Project B", "Project C", "Project D"),
     ("Team Alpha", "Team Beta", "Team Gamma", "Team Delta"),
@@ -87,7 +95,7 @@ GROUP_PRIMARY_LABELS: Sequence[Sequence[str]] = (
     ("Quarter 1", "Quarter 2", "Quarter 3", "Quarter 4"),
 )
 
-GROUP_SECONDARY_LABELS: Sequence[Sequence[str]] = (
+GROUP_SECONDARY_LABELS: Tuple[Tuple[str, ...], ...] = (
     ("Preschool", "Primary", "Secondary"),
     ("On-Time", "Delayed", "Critical"),
     ("Low", "Medium", "High"),
@@ -119,6 +127,9 @@ GROUP_SECONDARY_LABELS: Sequence[Sequence[str]] = (
 )
 
 
+# Shared generator for label and value draws; reseeded by --seed.
+rng = np.random.default_rng()
+
 
 @dataclass
 class TableSpec:
@@ -130,27 +141,25 @@ class TableSpec:
     notes: str | None = None
 
 
-def random_from_pool(pool: Sequence[Sequence[str]]) -> Sequence[str]:
-    """Return a random list from a pool."""
-    return random.choice(pool)
+def random_from_pool(pool: Sequence[Tuple[str, ...]]) -> Tuple[str, ...]:
+    """Return a random label tuple from a pool."""
+    return pool[rng.integers(0, len(pool))]
 
 
-def choose_labels(pool: Sequence[Sequence[str]], min_len: int, max_len: int) -> List[str]:
-    """Choose a subset of labels from a pool while preserving ordering."""
-    labels = list(random_from_pool(pool))
-    k = random.randint(min(min_len, len(labels)), min(max_len, len(labels)))
+def choose_labels(pool: Sequence[Tuple[str, ...]], min_len: int, max_len: int) -> Tuple[str, ...]:
+    """Choose a prefix of labels from a pool while preserving ordering."""
+    labels = random_from_pool(pool)
+    k = int(rng.integers(min(min_len, len(labels)), min(max_len, len(labels)) + 1))
     return labels[:k]
 
 
 def gen_single_series() -> Tuple[TableSpec, List[Tuple[str, int]]]:
     labels = choose_labels(SINGLE_SERIES_CATEGORY_POOLS, 4, 6)
     header = ("Category", "Value")
-    rows = []
-    for label in labels:
-        base = random.randint(10, 70)
-        noise = random.randint(-5, 8)
-        value = max(1, base + noise)
-        rows.append((label, value))
+    base = rng.integers(10, 71, size=len(labels))
+    noise = rng.integers(-5, 9, size=len(labels))
+    values = np.maximum(1, base + noise)
+    rows = list(zip(labels, values.tolist()))
 
     spec = TableSpec(
         table_type="single_series",
@@ -165,18 +174,21 @@ def gen_grouped_series() -> Tuple[TableSpec, List[Tuple[str, str, int]]]:
     primary_labels = choose_labels(GROUP_PRIMARY_LABELS, 3, 5)
     secondary_labels = choose_labels(GROUP_SECONDARY_LABELS, 3, 4)
     header = ("Group", "Subgroup", "Value")
-    rows: List[Tuple[str, str, int]] = []
-
-    for primary in primary_labels:
-        base = random.randint(5, 9)
-        share_total = random.uniform(12.0, 25.0)
-        weights = [abs(random.gauss(1.0, 0.4)) for _ in secondary_labels]
-        weight_sum = sum(weights) or 1.0
-        normalized = [w / weight_sum for w in weights]
-
-        for secondary, weight in zip(secondary_labels, normalized):
-            value = max(1, int(round(base + share_total * weight + random.uniform(-1.5, 1.5))))
-            rows.append((primary, secondary, value))
+    shape = (len(primary_labels), len(secondary_labels))
+
+    # One row of weights per primary label, normalized to sum to one.
+    base = rng.integers(5, 10, size=(shape[0], 1))
+    share_total = rng.uniform(12.0, 25.0, size=(shape[0], 1))
+    weights = np.abs(rng.normal(1.0, 0.4, size=shape))
+    normalized = weights / weights.sum(axis=1, keepdims=True)
+    noise = rng.uniform(-1.5, 1.5, size=shape)
+    values = np.maximum(1, np.round(base + share_total * normalized + noise)).astype(int)
+
+    rows: List[Tuple[str, str, int]] = [
+        (primary, secondary, value)
+        for primary, row in zip(primary_labels, values.tolist())
+        for secondary, value in zip(secondary_labels, row)
+    ]
 
     spec = TableSpec(
         table_type="grouped_series",
@@ -190,10 +202,12 @@ def gen_grouped_series() -> Tuple[TableSpec, List[Tuple[str, str, int]]]:
 
 
 def write_csv(path: Path, header: Sequence[str], rows: Sequence[Sequence[int | str]]) -> None:
-    with path.open("w", newline="", encoding="utf-8") as fh:
-        writer = csv.writer(fh)
-        writer.writerow(header)
-        writer.writerows(rows)
+    """Render the table in memory and write it with a single call."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    writer.writerows(rows)
+    path.write_bytes(buf.getvalue().encode("utf-8"))
 
 
 def parse_args() -> argparse.Namespace:
@@ -206,9 +220,10 @@ def parse_args() -> argparse.Namespace:
 
 
 def main() -> None:
+    global rng
     args = parse_args()
     if args.seed is not None:
-        random.seed(args.seed)
+        rng = np.random.default_rng(args.seed)
 
     output_dir: Path = args.output_dir
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -234,8 +249,11 @@ def main() -> None:
         write_csv(csv_path, spec.header, rows)
         manifest[filename] = asdict(spec)
 
-    with manifest_path.open("w", encoding="utf-8") as fh:
-        json.dump(manifest, fh, indent=2)
+    if HAS_ORJSON:
+        manifest_path.write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+    else:
+        with manifest_path.open("w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=2)
 
     print(f"Generated {args.single_count + args.grouped_count} tables in {output_dir}")
     print(f"Manifest saved to {manifest_path}")
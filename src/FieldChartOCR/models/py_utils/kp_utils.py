@@ -84,7 +84,7 @@ def _tranpose_and_gather_features(feat, ind):
 def _topk(scores, K=20):
     batch, cat, height, width = scores.size()
 
-    topk_scores, topk_inds = torch.topk(scores.view(batch, -1), K)
+    topk_scores, topk_inds = torch.topk(scores.reshape(batch, -1), K)
 
     topk_clses = (topk_inds / (height * width)).int()
 
@@ -103,7 +103,7 @@ def _getGT(scores, GT, K):
         topk_inds = torch.cat((topk_inds, tmp), 1)
     else:
         topk_inds = topk_inds[:, 0:K]
-    topk_scores_, topk_inds_ = torch.topk(scores.view(batch, -1), K)
+    topk_scores_, topk_inds_ = torch.topk(scores.reshape(batch, -1), K)
     topk_inds = topk_inds.cuda()
     topk_scores = torch.ones_like(topk_inds).float().cuda()
     topk_inds = topk_inds.long()
@@ -124,6 +124,11 @@ def _decode(
 ):
     batch, cat, height, width = tl_heat.size()
 
+    # decode in fp32 even if the heads ran under autocast
+    tl_heat, br_heat = tl_heat.float(), br_heat.float()
+    tl_tag, br_tag   = tl_tag.float(), br_tag.float()
+    tl_regr, br_regr = tl_regr.float(), br_regr.float()
+
     tl_heat = torch.sigmoid(tl_heat)
     br_heat = torch.sigmoid(br_heat)
 
@@ -233,23 +238,22 @@ def _decode(
 
 def _decode_pure(
         tl_heat, br_heat, tl_regr, br_regr,
-        K=100, kernel=1, ae_threshold=1, num_dets=1000
+        K=100, kernel=1, ae_threshold=1, num_dets=1000, corner_only=False
 ):
+    # corner_only decodes just the first (tl) head and returns None for br
     batch, cat, height, width = tl_heat.size()
 
+    # decode in fp32 even if the heads ran under autocast
+    tl_heat, tl_regr = tl_heat.float(), tl_regr.float()
+
     tl_heat = torch.sigmoid(tl_heat)
-    br_heat = torch.sigmoid(br_heat)
 
     # perform nms on heatmaps
     tl_heat = _nms(tl_heat, kernel=kernel)
-    br_heat = _nms(br_heat, kernel=kernel)
 
     tl_scores, tl_inds, tl_clses, tl_ys, tl_xs = _topk(tl_heat, K=K)
-    br_scores, br_inds, br_clses, br_ys, br_xs = _topk(br_heat, K=K)
     # print(tl_scores)
     tl_regr_ = _tranpose_and_gather_feat(tl_regr, tl_inds)
-    br_regr_ = _tranpose_and_gather_feat(br_regr, br_inds)
-
 
     tl_scores_ = tl_scores.view(1, batch, K)
     tl_clses_ = tl_clses.view(1, batch, K)
@@ -261,6 +265,16 @@ def _decode_pure(
     tl_xs_ += tl_regr_[:, :, :, 0]
     # print(tl_xs_[0, 0])
     tl_ys_ += tl_regr_[:, :, :, 1]
+    detections_tl = torch.cat([tl_scores_, tl_clses_.float(), tl_xs_, tl_ys_], dim=0)
+    if corner_only:
+        return detections_tl, None
+
+    br_heat, br_regr = br_heat.float(), br_regr.float()
+    br_heat = torch.sigmoid(br_heat)
+    br_heat = _nms(br_heat, kernel=kernel)
+    br_scores, br_inds, br_clses, br_ys, br_xs = _topk(br_heat, K=K)
+    br_regr_ = _tranpose_and_gather_feat(br_regr, br_inds)
+
     br_scores_ = br_scores.view(1, batch, K)
     br_clses_ = br_clses.view(1, batch, K)
     br_xs_ = br_xs.view(1, batch, K)
@@ -268,7 +282,6 @@ def _decode_pure(
     br_regr_ = br_regr_.view(1, batch, K, 2)
     br_xs_ += br_regr_[:, :, :, 0]
     br_ys_ += br_regr_[:, :, :, 1]
-    detections_tl = torch.cat([tl_scores_, tl_clses_.float(), tl_xs_, tl_ys_], dim=0)
     detections_br = torch.cat([br_scores_, br_clses_.float(), br_xs_, br_ys_], dim=0)
 
     return detections_tl, detections_br
@@ -68,6 +68,11 @@ class NetworkFactory(object):
         self.network.cuda(cuda_id)
         self.cuda_id = cuda_id
 
+    def channels_last(self):
+        # NHWC lets cuDNN/oneDNN pick their faster conv kernels (torch >= 1.5)
+        if hasattr(torch, "channels_last"):
+            self.model.to(memory_format=torch.channels_last)
+
     def train_mode(self):
         self.network.train()
 
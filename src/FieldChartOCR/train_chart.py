@@ -183,9 +183,7 @@ def train(training_dbs, validation_db, start_iter=0):
     for training_task in training_tasks:
         training_task.terminate()
 
-if __name__ == "__main__":
-
-    args = parse_args()
+def main(args):
     cfg_file = os.path.join(system_configs.config_dir, args.cfg_file + ".json")
     with open(cfg_file, "r") as f:
         configs = json.load(f)
@@ -215,3 +213,6 @@ if __name__ == "__main__":
 
     print("len of db: {}".format(len(training_dbs[0].db_inds)))
     train(training_dbs, validation_db, args.start_iter)
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -11,40 +11,108 @@ import os
 import json
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from tqdm import tqdm
 
 def load_templates(template_dir):
-    """Load all template images from the template directory."""
-    templates = []
+    """
+    Load all template images from the template directory as grayscale.
+    
+    Returns:
+        (names, images, shapes): parallel lists of template file names and
+        grayscale images, plus a (K, 2) array of (height, width)
+    """
+    names = []
+    images = []
     
-    template_files = [f for f in os.listdir(template_dir) 
-                     if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    with os.scandir(template_dir) as it:
+        template_entries = sorted((e for e in it
+                                   if e.is_file() and e.name.lower().endswith(('.jpg', '.jpeg', '.png'))),
+                                  key=lambda e: e.name)
 
-    for template_file in template_files:
-        template_path = os.path.join(template_dir, template_file)
-        template = cv2.imread(template_path)
+    for entry in template_entries:
+        # Read straight to grayscale for template matching
+        template = cv2.imread(entry.path, cv2.IMREAD_GRAYSCALE)
         if template is not None:
-            # Convert to grayscale for template matching
-            template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-            templates.append({
-                'image': template_gray,
-                'name': template_file,
-                'original': template
-            })
-    
-    print(f"Loaded {len(templates)} template images")
-    return templates
+            names.append(entry.name)
+            images.append(np.ascontiguousarray(template))
+    
+    shapes = np.array([t.shape for t in images], dtype=np.int32).reshape(-1, 2)
+    print(f"Loaded {len(names)} template images")
+    return names, images, shapes
+
+def prepare_search_level(search_area):
+    """
+    Precompute what frequency-domain matching needs from one search image.
+    
+    Returns:
+        (spectrum, sums, sq_sums, shape): the forward DFT of the zero-padded
+        image, its integral and squared-integral images, and its (h, w)
+    """
+    h, w = search_area.shape
+    dft_h, dft_w = cv2.getOptimalDFTSize(h), cv2.getOptimalDFTSize(w)
+    padded = np.zeros((dft_h, dft_w), dtype=np.float32)
+    padded[:h, :w] = search_area
+    spectrum = cv2.dft(padded, flags=cv2.DFT_COMPLEX_OUTPUT)
+    sums, sq_sums = cv2.integral2(search_area, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    return spectrum, sums, sq_sums, (h, w)
 
-def detect_corner_with_templates(image, templates, search_region=None, scales=[0.5, 0.75, 1.0, 1.25, 1.5]):
+def match_template_dft(search_level, template):
+    """
+    TM_CCOEFF_NORMED match of a template against a prepared search level.
+    
+    The search image is transformed once in prepare_search_level, so each
+    template only pays for its own forward DFT and one inverse DFT. Window
+    statistics come from the integral images.
+    """
+    spectrum, sums, sq_sums, (h, w) = search_level
+    t_h, t_w = template.shape
+    
+    # Zero-mean template, so the correlation is the CCOEFF numerator
+    tmpl = template.astype(np.float32)
+    tmpl -= tmpl.mean()
+    tmpl_norm = np.sqrt(np.sum(tmpl * tmpl, dtype=np.float64))
+    padded = np.zeros(spectrum.shape[:2], dtype=np.float32)
+    padded[:t_h, :t_w] = tmpl
+    tmpl_spectrum = cv2.dft(padded, flags=cv2.DFT_COMPLEX_OUTPUT)
+    
+    product = cv2.mulSpectrums(spectrum, tmpl_spectrum, 0, conjB=True)
+    corr = cv2.idft(product, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE)
+    corr = corr[:h - t_h + 1, :w - t_w + 1]
+    
+    # Per-window sum and sum of squares of the search image
+    n = t_h * t_w
+    win_sum = sums[t_h:, t_w:] - sums[:-t_h, t_w:] - sums[t_h:, :-t_w] + sums[:-t_h, :-t_w]
+    win_sq = sq_sums[t_h:, t_w:] - sq_sums[:-t_h, t_w:] - sq_sums[t_h:, :-t_w] + sq_sums[:-t_h, :-t_w]
+    denom = tmpl_norm * np.sqrt(np.maximum(win_sq - win_sum * win_sum / n, 0.0))
+    
+    result = np.zeros(corr.shape, dtype=np.float32)
+    np.divide(corr, denom, out=result, where=denom > 1e-6)
+    return result
+
+def detect_corner_with_templates(image, template_names, template_images, template_shapes,
+                                 search_region=None, scales=[0.5, 0.75, 1.0, 1.25, 1.5],
+                                 coarse_levels=2, refine_margin=16):
     """
     Detect corner using multiple templates and scales.
     
+    Matching runs coarse-to-fine. Every (template, scale) pair is first tried
+    on a copy of the search area pyrDown'ed coarse_levels times, where all
+    templates share one DFT of the search area. The best coarse hit is then
+    re-matched once at full resolution in a window of +/- refine_margin
+    pixels, so the returned location and confidence are full-resolution.
+    
     Args:
-        image: Full image to search in
-        templates: List of template images
+        image: Full grayscale image to search in
+        template_names: Template file names, as returned by load_templates
+        template_images: Grayscale template images
+        template_shapes: (K, 2) array of template (height, width)
         search_region: (x, y, width, height) to limit search area, or None for full image
         scales: List of scales to try for multi-scale matching
+        coarse_levels: Number of pyrDown steps for the coarse search
+        refine_margin: Half-size in pixels of the full-resolution refinement window
     
     Returns:
         (x, y, confidence) or (None, None, 0.0) if not found
@@ -63,83 +131,129 @@ def detect_corner_with_templates(image, templates, search_region=None, scales=[0
     x_start, y_start, region_w, region_h = search_region
     search_area = image_gray[y_start:y_start+region_h, x_start:x_start+region_w]
     
+    # Coarse search area, transformed once and shared across all templates
+    coarse = search_area
+    for _ in range(coarse_levels):
+        coarse = cv2.pyrDown(coarse)
+    coarse_level = prepare_search_level(coarse)
+    coarse_h, coarse_w = coarse.shape
+    factor = 2 ** coarse_levels
+    
     best_match = None
-    best_confidence = 0.0
-    best_location = (None, None)
+    best_coarse = 0.0
     
     # Try each template
-    for template_info in templates:
-        template = template_info['image']
-        t_h, t_w = template.shape
+    for template_name, template, (t_h, t_w) in zip(template_names, template_images, template_shapes):
+        coarse_template = template
+        for _ in range(coarse_levels):
+            coarse_template = cv2.pyrDown(coarse_template)
+        c_h, c_w = coarse_template.shape
         
         # Try different scales
         for scale in scales:
-            # Resize template
             scaled_w = int(t_w * scale)
             scaled_h = int(t_h * scale)
+            coarse_sw = int(c_w * scale)
+            coarse_sh = int(c_h * scale)
             
             if scaled_w > region_w or scaled_h > region_h:
                 continue
+            if coarse_sw < 2 or coarse_sh < 2 or coarse_sw > coarse_w or coarse_sh > coarse_h:
+                continue
             
-            scaled_template = cv2.resize(template, (scaled_w, scaled_h))
-            
-            # Perform template matching
-            result = cv2.matchTemplate(search_area, scaled_template, cv2.TM_CCOEFF_NORMED)
+            scaled_template = cv2.resize(coarse_template, (coarse_sw, coarse_sh))
+            result = match_template_dft(coarse_level, scaled_template)
             min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
             
-            # Update best match
-            if max_val > best_confidence:
-                best_confidence = max_val
-                # Convert back to full image coordinates
-                best_location = (max_loc[0] + x_start + scaled_w // 2, 
-                                max_loc[1] + y_start + scaled_h // 2)
+            # Update best coarse match
+            if max_val > best_coarse:
+                best_coarse = max_val
                 best_match = {
-                    'template': template_info['name'],
+                    'template': template,
+                    'template_name': template_name,
                     'scale': scale,
-                    'confidence': max_val
+                    'size': (scaled_w, scaled_h),
+                    'location': (max_loc[0] * factor, max_loc[1] * factor)
                 }
+    
+    if best_match is None:
+        return None, None, 0.0
+    
+    # Refine the best coarse hit at full resolution in a small window
+    scaled_w, scaled_h = best_match['size']
+    coarse_x, coarse_y = best_match['location']
+    roi_x = max(0, coarse_x - refine_margin)
+    roi_y = max(0, coarse_y - refine_margin)
+    roi_x2 = min(region_w, coarse_x + scaled_w + refine_margin)
+    roi_y2 = min(region_h, coarse_y + scaled_h + refine_margin)
+    roi_x = max(0, min(roi_x, roi_x2 - scaled_w))
+    roi_y = max(0, min(roi_y, roi_y2 - scaled_h))
+    roi = search_area[roi_y:roi_y2, roi_x:roi_x2]
+    
+    scaled_template = cv2.resize(best_match['template'], (scaled_w, scaled_h))
+    result = cv2.matchTemplate(roi, scaled_template, cv2.TM_CCOEFF_NORMED)
+    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    
+    # Convert back to full image coordinates
+    x = roi_x + max_loc[0] + x_start + scaled_w // 2
+    y = roi_y + max_loc[1] + y_start + scaled_h // 2
+    return x, y, max_val
 
-    return best_location[0], best_location[1], best_confidence
+def _process_one(task, templates):
+    """Load one image and detect its corner; runs on a worker thread."""
+    image_file, image_path = task
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return image_file, None
+    return image_file, detect_corner_with_templates(image, *templates)
 
-def auto_detect_corners(template_dir, image_dir, output_file, confidence_threshold=0.5):
+def auto_detect_corners(template_dir, image_dir, output_file, confidence_threshold=0.5, workers=None):
     """
     Auto-detect corners in all images using templates.
     
+    Images are processed on a thread pool; the OpenCV calls release the GIL,
+    so the matching runs in parallel while the templates are shared read-only.
+    
     Args:
         template_dir: Directory containing template QC square images
         image_dir: Directory containing full images to search
         output_file: Path to save annotations JSON
         confidence_threshold: Minimum confidence to accept a detection
+        workers: Number of worker threads (default: CPU count)
     """
     # Load templates
     templates = load_templates(template_dir)
-    if len(templates) == 0:
+    if len(templates[0]) == 0:
         print(f"Error: No templates found in {template_dir}")
         return
     
     # Get all images
-    image_files = [f for f in os.listdir(image_dir) 
-                   if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    with os.scandir(image_dir) as it:
+        image_entries = sorted((e for e in it
+                                if e.is_file() and e.name.lower().endswith(('.jpg', '.jpeg', '.png'))),
+                               key=lambda e: e.name)
     
     # Filter out distorted images (we want original images)
-    image_files = [f for f in image_files if '_distorted' not in f]
+    image_entries = [e for e in image_entries if '_distorted' not in e.name]
     
-    print(f"Processing {len(image_files)} images...")
+    print(f"Processing {len(image_entries)} images...")
     
     annotations = {}
     detected_count = 0
     low_confidence_count = 0
     
-    for image_file in tqdm(image_files):
-        image_path = os.path.join(image_dir, image_file)
-        image = cv2.imread(image_path)
-        
-        if image is None:
+    tasks = [(e.name, e.path) for e in image_entries]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        results = list(tqdm(executor.map(partial(_process_one, templates=templates), tasks),
+                            total=len(tasks)))
+    
+    # Collect results on the main thread
+    for image_file, detection in results:
+        if detection is None:
             print(f"Warning: Could not load {image_file}")
             continue
         
-        # Detect corner
-        x, y, confidence = detect_corner_with_templates(image, templates)
+        x, y, confidence = detection
         
         if x is not None and y is not None and confidence >= confidence_threshold:
             annotations[image_file] = {
@@ -191,6 +305,9 @@ def main():
     parser.add_argument('--confidence_threshold', type=float,
                        default=0.5,
                        help='Minimum confidence threshold (0.0-1.0)')
+    parser.add_argument('--workers', type=int,
+                       default=None,
+                       help='Number of worker threads (default: CPU count)')
     
     args = parser.parse_args()
     
@@ -207,7 +324,7 @@ def main():
         print(f"Error: Image directory not found: {image_dir}")
         return
     
-    auto_detect_corners(template_dir, image_dir, output_file, args.confidence_threshold)
+    auto_detect_corners(template_dir, image_dir, output_file, args.confidence_threshold, args.workers)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
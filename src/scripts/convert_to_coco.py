@@ -7,12 +7,118 @@ Convert verified annotations to COCO format for training.
 import os
 import json
 import shutil
-import cv2
 import numpy as np
+from PIL import Image, UnidentifiedImageError
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-def create_coco_structure(annotations_file, image_dir, output_dir, train_ratio=0.8, val_ratio=0.1):
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+EXIF_ORIENTATION = 0x0112
+
+# Split-independent part of every COCO file; only read, never mutated
+_COCO_BASE = {
+    "info": {
+        "description": "Top-right corner detection dataset",
+        "version": "1.0",
+        "year": 2025
+    },
+    "licenses": [],
+    "categories": [
+        {
+            "id": 0,
+            "name": "top_right_corner",
+            "supercategory": "corner"
+        }
+    ]
+}
+
+def _fast_place(src, dst):
+    """
+    Hardlink src to dst, falling back to a plain copy across filesystems.
+    
+    An existing dst is replaced, never written through: it may be a hardlink
+    left by a run against another image_dir, sharing that run's source inode.
+    """
+    try:
+        os.link(src, dst)
+        return
+    except FileExistsError:
+        # Left over from a previous run; refresh it unless it is already the same file
+        if os.path.samefile(src, dst):
+            return
+        os.unlink(dst)
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    except OSError:
+        pass
+    # Copy beside dst and rename it into place, so no existing inode is modified
+    tmp = dst + '.tmp'
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+def _iter_annotations(annotations_file):
+    """Yield (image file, annotation) pairs from the top-level annotations object."""
+    if HAS_IJSON:
+        # Parse incrementally so only one record is materialized at a time
+        with open(annotations_file, 'rb') as f:
+            yield from ijson.kvitems(f, '', use_float=True)
+    else:
+        with open(annotations_file, 'r') as f:
+            yield from json.load(f).items()
+
+def _image_size(path):
+    """
+    Return (width, height) from the image header without decoding pixels.
+    
+    EXIF rotations of 90/270 degrees swap the axes, matching what cv2.imread
+    would report for the decoded image.
+    """
+    with Image.open(path) as im:
+        width, height = im.size
+        if im.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+    return width, height
+
+def _ingest(task):
+    """
+    Copy one image into its split directory and read its dimensions.
+    
+    Returns:
+        (width, height), or None if the image is missing or unreadable
+    """
+    src_path, dst_path = task
+    
+    # A missing source surfaces from the link/copy itself, no separate stat
+    try:
+        _fast_place(src_path, dst_path)
+    except FileNotFoundError:
+        print(f"Warning: Image not found: {src_path}")
+        return None
+    
+    # Get image dimensions
+    try:
+        return _image_size(src_path)
+    except (UnidentifiedImageError, OSError):
+        print(f"Warning: Could not read image: {src_path}")
+        return None
+
+def create_coco_structure(annotations_file, image_dir, output_dir, train_ratio=0.8, val_ratio=0.1,
+                          workers=32):
     """
     Convert annotations to COCO format and organize images into train/val/test splits.
     
@@ -22,18 +128,17 @@ def create_coco_structure(annotations_file, image_dir, output_dir, train_ratio=0
         output_dir: Output directory for COCO dataset
         train_ratio: Ratio of images for training
         val_ratio: Ratio of images for validation (test gets the rest)
+        workers: Number of threads overlapping file placement and header reads
     """
-    # Load annotations
-    with open(annotations_file, 'r') as f:
-        annotations = json.load(f)
-    
-    # Filter out images without valid annotations
+    # Stream annotations, keeping only images with valid annotations
     valid_annotations = {}
-    for img_file, ann in annotations.items():
+    n_annotations = 0
+    for img_file, ann in _iter_annotations(annotations_file):
+        n_annotations += 1
         if ann.get('x') is not None and ann.get('y') is not None:
             valid_annotations[img_file] = ann
     
-    print(f"Found {len(valid_annotations)} valid annotations out of {len(annotations)} total")
+    print(f"Found {len(valid_annotations)} valid annotations out of {n_annotations} total")
     
     # Create directory structure
     data_dir = os.path.join(output_dir, "top_right")
@@ -48,9 +153,9 @@ def create_coco_structure(annotations_file, image_dir, output_dir, train_ratio=0
         os.makedirs(d, exist_ok=True)
     
     # Split images
-    image_files = sorted(list(valid_annotations.keys()))
-    np.random.seed(42)  # For reproducibility
-    np.random.shuffle(image_files)
+    image_files = sorted(valid_annotations.keys())
+    rng = np.random.default_rng(42)  # For reproducibility
+    image_files = [image_files[i] for i in rng.permutation(len(image_files))]
     
     n_total = len(image_files)
     n_train = int(n_total * train_ratio)
@@ -69,46 +174,22 @@ def create_coco_structure(annotations_file, image_dir, output_dir, train_ratio=0
         'test2019': test_files
     }
     
+    executor = ThreadPoolExecutor(max_workers=workers)
     for split_name, files in splits.items():
-        coco_data = {
-            "info": {
-                "description": "Top-right corner detection dataset",
-                "version": "1.0",
-                "year": 2025
-            },
-            "licenses": [],
-            "images": [],
-            "annotations": [],
-            "categories": [
-                {
-                    "id": 0,
-                    "name": "top_right_corner",
-                    "supercategory": "corner"
-                }
-            ]
-        }
+        coco_data = {**_COCO_BASE, "images": [], "annotations": []}
         
         image_id = 0
         annotation_id = 0
         
-        for img_file in files:
-            # Copy image to split directory
-            src_path = os.path.join(image_dir, img_file)
-            dst_path = os.path.join(images_dir, split_name, img_file)
-            
-            if not os.path.exists(src_path):
-                print(f"Warning: Image not found: {src_path}")
-                continue
-            
-            shutil.copy2(src_path, dst_path)
-            
-            # Get image dimensions
-            img = cv2.imread(src_path)
-            if img is None:
-                print(f"Warning: Could not read image: {src_path}")
+        # Place images and read their headers concurrently; results come back
+        # in input order so image and annotation IDs stay deterministic
+        tasks = [(os.path.join(image_dir, img_file), os.path.join(images_dir, split_name, img_file))
+                 for img_file in files]
+        
+        for img_file, (src_path, _), size in zip(files, tasks, executor.map(_ingest, tasks)):
+            if size is None:
                 continue
-            
-            height, width = img.shape[:2]
+            width, height = size
             
             # Add image info
             coco_data["images"].append({
@@ -138,12 +219,17 @@ def create_coco_structure(annotations_file, image_dir, output_dir, train_ratio=0
         
         # Save COCO JSON
         output_file = os.path.join(annotations_dir, f"instancesTopRight_{split_name}.json")
-        with open(output_file, 'w') as f:
-            json.dump(coco_data, f, indent=2)
+        if HAS_ORJSON:
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(coco_data, option=orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(output_file, 'w') as f:
+                json.dump(coco_data, f, separators=(',', ':'))
         
         print(f"Created {split_name}: {len(coco_data['images'])} images, {len(coco_data['annotations'])} annotations")
         print(f"  Saved to: {output_file}")
     
+    executor.shutdown()
     print(f"\nCOCO dataset created in: {data_dir}")
 
 def main():
@@ -165,6 +251,9 @@ def main():
     parser.add_argument('--val_ratio', type=float,
                        default=0.1,
                        help='Ratio of images for validation (default: 0.1)')
+    parser.add_argument('--workers', type=int,
+                       default=32,
+                       help='Threads for copying images and reading headers (default: 32)')
     
     args = parser.parse_args()
     
@@ -181,7 +270,7 @@ def main():
         return
     
     create_coco_structure(annotations_file, image_dir, output_dir, 
-                         args.train_ratio, args.val_ratio)
+                         args.train_ratio, args.val_ratio, args.workers)
 
 if __name__ == '__main__':
     main()
@@ -25,9 +25,10 @@ def distort_images(input_folder, suffix="_distorted"):
         print(f"Error: Folder {input_folder} does not exist!")
         return
     
-    # Get all JPG files
-    jpg_files = [f for f in os.listdir(input_folder) 
-                 if f.lower().endswith(('.jpg', '.jpeg'))]
+    # Get all JPG files; the listing doubles as the set of existing outputs
+    with os.scandir(input_folder) as it:
+        entries = {e.name for e in it if e.is_file()}
+    jpg_files = sorted(f for f in entries if f.lower().endswith(('.jpg', '.jpeg')))
     
     if not jpg_files:
         print(f"No JPG files found in {input_folder}")
@@ -51,7 +52,7 @@ def distort_images(input_folder, suffix="_distorted"):
             output_path = os.path.join(input_folder, output_filename)
             
             # Skip if output already exists
-            if os.path.exists(output_path):
+            if output_filename in entries:
                 print(f"Skipping {filename} - output already exists")
                 continue
             
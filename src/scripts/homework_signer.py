@@ -4,13 +4,35 @@ try:
 except ImportError:
     HAS_SVGWRITE = False
 
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+import numpy as np
+from xml.sax.saxutils import escape, quoteattr
 import csv
 import os
 import argparse
 import sys
 import base64
+import copy
+import io
+import math
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import re
+from functools import lru_cache
+
+# lxml parses and serializes faster and keeps the document's namespace
+# prefixes; xml.etree is the fallback
+try:
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
 
 # PDF processing imports
 try:
@@ -19,6 +41,33 @@ try:
 except ImportError:
     HAS_PYMUPDF = False
 
+# Namespaces used by Inkscape SVGs
+_SVG_NS = 'http://www.w3.org/2000/svg'
+_INK_LABEL = '{http://www.inkscape.org/namespaces/inkscape}label'
+
+# Barcode fill, set both as style and as attribute for maximum compatibility
+_BAR_ATTRS = {'style': sys.intern('fill:#CCCCCCFF;fill-opacity:1'), 'fill': sys.intern('#CCCCCCFF')}
+
+# SVG length with an optional absolute unit, and px per unit at 96 dpi
+_LENGTH_RE = re.compile(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*(in|px|mm|cm|pt)?')
+_UNIT_PX = {'in': 96.0, 'px': 1.0, 'mm': 96 / 25.4, 'cm': 96 / 2.54, 'pt': 96 / 72, None: 1.0}
+
+# translate(tx) or translate(tx, ty) in a transform attribute
+_TRANSLATE_RE = re.compile(r'translate\(\s*([-+\d.eE]+)(?:[\s,]+([-+\d.eE]+))?\s*\)')
+
+# font-family declaration in an inline style
+_FONT_FAMILY_RE = re.compile(r'font-family:[^;]+')
+# An end tag at the very end of a byte string
+_END_TAG_RE = re.compile(rb'</([^\s<>/]+)\s*>\Z')
+
+# Hardcoded default font style as backup for the signed PDF label (used for SVG background)
+# Change DEFAULT_FONT_FAMILY to your desired font
+DEFAULT_FONT_FAMILY = 'Space Mono'  # Font name for SVG
+DEFAULT_FONT_SIZE = '13.3333px'
+DEFAULT_FILL_COLOR = '#cccccc'
+_FONT_FAMILY_DECL = f'font-family:{DEFAULT_FONT_FAMILY}'
+_DEFAULT_TEXT_STYLE = f'font-size:{DEFAULT_FONT_SIZE};{_FONT_FAMILY_DECL};fill:{DEFAULT_FILL_COLOR};fill-opacity:1'
+
 # 4-state barcode generator for Royal Mail (RM4SCC-like)
 # Following basic RM4SCC (often used for postal barcodes): F, A, D, T (tracker, ascender, descender, full)
 
@@ -34,37 +83,180 @@ CHAR_MAP = {
     # Add mappings as needed
 }
 
+# Bar string for every byte value, upper and lower case alike, so encoding
+# is one table lookup per byte
+_CHAR_TABLE = ['ATDA'] * 256  # default fallback
+for _c, _b in CHAR_MAP.items():
+    _CHAR_TABLE[ord(_c)] = _b
+    _CHAR_TABLE[ord(_c.lower())] = _b
+del _c, _b
+
+# Bar type code for every byte, for the geometry kernel: F=0, A=1, D=2, T=3
+_BAR_CODES = np.array([['FADT'.index(bar) for bar in bars] for bars in _CHAR_TABLE], dtype=np.uint8)
+
 def char_to_bars(c):
     c = c.upper()
     return CHAR_MAP.get(c, 'ATDA')  # default fallback
 
+@lru_cache(maxsize=1024)
+def _encode_bars(data):
+    # Non-ASCII characters become '?', which takes the default bars
+    return ''.join([_CHAR_TABLE[b] for b in data.encode('ascii', 'replace')])
+
 def encode_4state_barcode(data):
-    bars = []
-    for c in data:
-        bars.extend(char_to_bars(c))
-    return bars
+    return list(_encode_bars(data))
 
 def generate_4state_barcode_svg(data, filename='barcode.svg', bar_width=4, space=2, height_full=50, height_asc=40, height_desc=40, tracker_height=10):
     if not HAS_SVGWRITE:
         raise ImportError("svgwrite is required for generate_4state_barcode_svg. Install it with: pip install svgwrite")
     bars = encode_4state_barcode(data)
     dwg = svgwrite.Drawing(filename, size=(len(bars) * (bar_width + space), height_full))
-    x = 0
-    y_full = 0
     y_tracker = (height_full - tracker_height) // 2
-    for bar in bars:
-        if bar == 'F':  # Full
-            dwg.add(dwg.rect((x, y_full), (bar_width, height_full), fill='black'))
-        elif bar == 'A':  # Ascender
-            dwg.add(dwg.rect((x, y_full), (bar_width, height_asc), fill='black'))
-        elif bar == 'D':  # Descender
-            dwg.add(dwg.rect((x, height_full - height_desc), (bar_width, height_desc), fill='black'))
-        elif bar == 'T':  # Tracker
-            dwg.add(dwg.rect((x, y_tracker), (bar_width, tracker_height), fill='black'))
-        x += bar_width + space
+    # All bars as one path rather than one rect object per bar
+    d = _barcode_path_d(data, 0, 0, y_tracker, bar_width, space, height_full, height_asc, height_desc, tracker_height)
+    dwg.add(dwg.path(d=d, fill='black'))
     dwg.save()
 
-def insert_barcode_into_svg(input_svg_path, barcode_data, output_svg_path=None, bar_width=None, space=None, label_text=None, position=None):
+if HAS_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def _encode_and_layout(data_u8, table_u8, start_x, start_y, bar_width, space, height_full, height_asc, height_desc, tracker_height, y_tracker):
+        """Fused encode and layout kernel, without index-array temporaries."""
+        n = data_u8.shape[0] * 4
+        xs = np.empty(n)
+        ys = np.empty(n)
+        hs = np.empty(n)
+        for i in range(data_u8.shape[0]):
+            for j in range(4):
+                k = i * 4 + j
+                code = table_u8[data_u8[i], j]
+                xs[k] = start_x + k * (bar_width + space)
+                if code == 0:  # Full
+                    ys[k] = start_y
+                    hs[k] = height_full
+                elif code == 1:  # Ascender
+                    ys[k] = start_y
+                    hs[k] = height_asc
+                elif code == 2:  # Descender
+                    ys[k] = start_y + height_full - height_desc
+                    hs[k] = height_desc
+                else:  # Tracker
+                    ys[k] = y_tracker
+                    hs[k] = tracker_height
+        return xs, ys, hs
+else:
+    def _encode_and_layout(data_u8, table_u8, start_x, start_y, bar_width, space, height_full, height_asc, height_desc, tracker_height, y_tracker):
+        """
+        Encode bytes to bars and lay them out in one pass.
+        
+        Returns:
+            tuple: (xs, ys, hs) arrays with the x, y and height of every bar
+        """
+        codes = table_u8[data_u8].ravel()
+        xs = start_x + np.arange(len(codes)) * (bar_width + space)
+        ys = np.array([start_y, start_y, start_y + height_full - height_desc, y_tracker])[codes]
+        hs = np.array([height_full, height_asc, height_desc, tracker_height])[codes]
+        return xs, ys, hs
+
+def _barcode_path_d(barcode_data, start_x, start_y, y_tracker, bar_width, space, height_full, height_asc, height_desc, tracker_height):
+    """
+    Build the SVG path data for a barcode, one closed subpath per bar.
+    
+    Returns:
+        str: The 'd' attribute drawing every bar of the barcode
+    """
+    data_u8 = np.frombuffer(barcode_data.encode('ascii', 'replace'), dtype=np.uint8)
+    xs, ys, hs = _encode_and_layout(data_u8, _BAR_CODES, float(start_x), float(start_y),
+                                    float(bar_width), float(space), float(height_full), float(height_asc),
+                                    float(height_desc), float(tracker_height), float(y_tracker))
+    w = f"{bar_width:.2f}"
+    return ''.join([f"M{x:.2f} {y:.2f}h{w}v{h:.2f}h-{w}z"
+                    for x, y, h in zip(xs.tolist(), ys.tolist(), hs.tolist())])
+
+@lru_cache(maxsize=1024)
+def _compute_path_d(data, bar_width, space, h_full, h_asc, h_desc, h_track):
+    """Path data for a barcode drawn at the origin, shared by every placement with the same geometry."""
+    return _barcode_path_d(data, 0, 0, (h_full - h_track) / 2, bar_width, space, h_full, h_asc, h_desc, h_track)
+
+def _emit_barcode(parent, g_tag, path_tag, barcode_data, start_x, start_y, bar_width, space, height_full, height_asc, height_desc, tracker_height):
+    """Append the barcode to parent as one path element, translated into place by a wrapping group."""
+    d = _compute_path_d(barcode_data, round(bar_width, 3), round(space, 3), round(height_full, 3),
+                        round(height_asc, 3), round(height_desc, 3), round(tracker_height, 3))
+    group = ET.SubElement(parent, g_tag, {'transform': f'translate({start_x:.2f} {start_y:.2f})'})
+    ET.SubElement(group, path_tag, {'d': d, **_BAR_ATTRS})
+    return group
+
+def _parse_svg(data):
+    """Parse SVG bytes into an element tree, dropping comments and processing instructions."""
+    if HAS_LXML:
+        parser = ET.XMLParser(remove_comments=True, remove_pis=True, huge_tree=True)
+        return ET.ElementTree(ET.fromstring(data, parser))
+    return ET.ElementTree(ET.fromstring(data))
+
+def _svg_qname(root, local_name):
+    """Return the qualified name of an SVG element in the namespace of root."""
+    if root.tag.startswith('{'):
+        svg_namespace = root.tag[1:root.tag.index('}')]
+    else:
+        svg_namespace = root.get('xmlns', _SVG_NS)
+    return '{' + svg_namespace + '}' + local_name
+
+def _parse_length(value, default):
+    """Convert an SVG length such as '8.5in' or '216mm' to px; unitless values are px."""
+    if value is None:
+        return float(default)
+    match = _LENGTH_RE.match(value)
+    if match is None:
+        return float(default)
+    return float(match.group(1)) * _UNIT_PX[match.group(2)]
+
+def _svg_size(root, default_width, default_height):
+    """Return the (width, height) of an SVG root, from the viewBox if it has one."""
+    # Try viewBox first (most reliable)
+    viewbox_parts = root.get('viewBox', '').replace(',', ' ').split()
+    if len(viewbox_parts) >= 4:
+        return float(viewbox_parts[2]), float(viewbox_parts[3])
+    # Fall back to the width/height attributes with unit handling
+    return (_parse_length(root.get('width'), default_width),
+            _parse_length(root.get('height'), default_height))
+
+def _element_markup(elem, svg_namespace):
+    """Serialize an element with unqualified attributes, declaring its namespace inline."""
+    tag = elem.tag.rpartition('}')[2]
+    xmlns = f' xmlns={quoteattr(svg_namespace)}' if svg_namespace else ''
+    attrs = ''.join(f' {k}={quoteattr(v)}' for k, v in elem.attrib.items())
+    if elem.text is None and len(elem) == 0:
+        return f'<{tag}{xmlns}{attrs}/>'
+    children = ''.join(_element_markup(child, None) for child in elem)
+    return f'<{tag}{xmlns}{attrs}>{escape(elem.text or "")}{children}</{tag}>'
+
+def _root_end_tag_offset(data, root):
+    """
+    Return the offset of the root element's end tag in the original SVG bytes.
+    
+    Trailing whitespace, comments and processing instructions after the root
+    are skipped. Returns None if the document does not end in the root's own
+    end tag (e.g. a self-closing root), so the caller can serialize the tree.
+    """
+    end = len(data)
+    while True:
+        tail = data[:end].rstrip()
+        if tail.endswith(b'-->'):
+            end = tail.rfind(b'<!--')
+        elif tail.endswith(b'?>'):
+            end = tail.rfind(b'<?')
+        else:
+            break
+        if end < 0:
+            return None
+    match = _END_TAG_RE.search(tail)
+    if match is None:
+        return None
+    # The end tag may carry a namespace prefix, e.g. </svg:svg>
+    if match.group(1).rpartition(b':')[2].decode('utf-8', 'replace') != root.tag.rpartition('}')[2]:
+        return None
+    return match.start()
+
+def insert_barcode_into_svg(input_svg_path, barcode_data, output_svg_path=None, bar_width=None, space=None, label_text=None, position=None, pretty=False):
     """
     Insert a barcode into an existing SVG document at the rect element with ID 'auspost'.
     If no auspost rect is found, adds barcode at specified position or default bottom-right.
@@ -77,16 +269,19 @@ def insert_barcode_into_svg(input_svg_path, barcode_data, output_svg_path=None,
         space: Space between bars (auto-calculated if None)
         label_text: Text to display in the label (defaults to barcode_data if None)
         position: Tuple (x, y) for barcode position if no auspost rect found (default: bottom-right)
+        pretty: Re-indent the whole document on output (default: keep the original formatting)
     """
     if output_svg_path is None:
         output_svg_path = input_svg_path
     
-    # Parse the existing SVG
-    tree = ET.parse(input_svg_path)
+    # Parse the existing SVG, keeping its bytes for the splice fast path
+    with open(input_svg_path, 'rb') as f:
+        original_bytes = f.read()
+    tree = _parse_svg(original_bytes)
     root = tree.getroot()
     
     # Register namespaces to handle SVG properly
-    namespaces = {'svg': 'http://www.w3.org/2000/svg'}
+    namespaces = {'svg': _SVG_NS}
     svg_namespace = None
     if root.tag.startswith('{'):
         # Extract namespace from root tag
@@ -98,75 +293,35 @@ def insert_barcode_into_svg(input_svg_path, barcode_data, output_svg_path=None,
         if 'xmlns' in root.attrib:
             svg_namespace = root.attrib['xmlns']
         else:
-            svg_namespace = 'http://www.w3.org/2000/svg'
+            svg_namespace = _SVG_NS
+    
+    # Qualified names for the elements created below
+    g_tag = '{' + svg_namespace + '}g'
+    path_tag = '{' + svg_namespace + '}path'
+    text_tag = '{' + svg_namespace + '}text'
+    tspan_tag = '{' + svg_namespace + '}tspan'
     
     # Find ALL rects with ID "auspost" or inkscape:label="auspost" (one per page)
     auspost_rects = []
     auspost_label_texts = []
     
-    def find_auspost_recursive(elem, parent=None):
-        nonlocal auspost_rects, auspost_label_texts
+    parent_map = None
+    for elem in root.iter():
         # Handle both namespaced and non-namespaced elements
-        tag = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
+        tag = elem.tag.rpartition('}')[2]
         if tag == 'rect':
             # Check for id="auspost" or inkscape:label="auspost"
-            elem_id = elem.get('id', '')
-            # Check for inkscape:label attribute (may be namespaced)
-            inkscape_label = None
-            for attr_name, attr_value in elem.attrib.items():
-                if attr_name.endswith('label') and attr_value == 'auspost':
-                    inkscape_label = attr_value
-                    break
-            if elem_id == 'auspost' or inkscape_label == 'auspost':
-                auspost_rects.append((elem, parent))
+            if elem.get('id') == 'auspost' or elem.get(_INK_LABEL) == 'auspost':
+                if parent_map is None:
+                    parent_map = {child: parent for parent in root.iter() for child in parent}
+                auspost_rects.append((elem, parent_map.get(elem)))
         elif tag == 'text':
             # Check for inkscape:label="auspost_label"
-            inkscape_label = None
-            for attr_name, attr_value in elem.attrib.items():
-                if attr_name.endswith('label') and attr_value == 'auspost_label':
-                    inkscape_label = attr_value
-                    break
-            if inkscape_label == 'auspost_label':
+            if elem.get(_INK_LABEL) == 'auspost_label':
                 auspost_label_texts.append(elem)
-        # Recursively search children
-        for child in elem:
-            find_auspost_recursive(child, elem)
-    
-    find_auspost_recursive(root)
     
     # Get SVG dimensions for fallback positioning
-    # Try viewBox first (most reliable)
-    if 'viewBox' in root.attrib:
-        viewbox_parts = root.attrib['viewBox'].split()
-        if len(viewbox_parts) >= 4:
-            svg_width = float(viewbox_parts[2])
-            svg_height = float(viewbox_parts[3])
-        else:
-            # Fallback to width/height attributes
-            width_attr = root.get('width', '612')
-            height_attr = root.get('height', '792')
-            # Handle units like '8.5in'
-            if 'in' in str(width_attr):
-                svg_width = float(str(width_attr).replace('in', '').strip()) * 96
-            else:
-                svg_width = float(width_attr)
-            if 'in' in str(height_attr):
-                svg_height = float(str(height_attr).replace('in', '').strip()) * 96
-            else:
-                svg_height = float(height_attr)
-    else:
-        # Parse width/height attributes with unit handling
-        width_attr = root.get('width', '612')
-        height_attr = root.get('height', '792')
-        # Handle units like '8.5in'
-        if 'in' in str(width_attr):
-            svg_width = float(str(width_attr).replace('in', '').strip()) * 96
-        else:
-            svg_width = float(width_attr)
-        if 'in' in str(height_attr):
-            svg_height = float(str(height_attr).replace('in', '').strip()) * 96
-        else:
-            svg_height = float(height_attr)
+    svg_width, svg_height = _svg_size(root, 612, 792)
     
     # Encode the barcode
     bars = encode_4state_barcode(barcode_data)
@@ -253,7 +408,6 @@ def insert_barcode_into_svg(input_svg_path, barcode_data, output_svg_path=None,
             # Calculate starting position (centered horizontally) for this page
             start_x = rect_x + (rect_width - total_barcode_width) / 2
             start_y = rect_y + (rect_height - height_full) / 2
-            y_tracker = start_y + (height_full - tracker_height) / 2
             
             # Find the corresponding page layer parent
             if page_layers and i < len(page_layers):
@@ -261,42 +415,9 @@ def insert_barcode_into_svg(input_svg_path, barcode_data, output_svg_path=None,
             else:
                 parent = auspost_parent if auspost_parent is not None else root
             
-            # Insert barcode rects for this page
-            x_pos = start_x
-            for bar in bars:
-                # Create rect element with proper namespace
-                if svg_namespace:
-                    rect_elem = ET.Element('{' + svg_namespace + '}rect')
-                else:
-                    rect_elem = ET.Element('rect')
-                # Set fill color as requested - using style attribute for better compatibility
-                rect_elem.set('style', 'fill:#CCCCCCFF;fill-opacity:1')
-                # Also set as attribute for maximum compatibility
-                rect_elem.set('fill', '#CCCCCCFF')
-                
-                if bar == 'F':  # Full
-                    rect_elem.set('x', str(x_pos))
-                    rect_elem.set('y', str(start_y))
-                    rect_elem.set('width', str(bar_width))
-                    rect_elem.set('height', str(height_full))
-                elif bar == 'A':  # Ascender
-                    rect_elem.set('x', str(x_pos))
-                    rect_elem.set('y', str(start_y))
-                    rect_elem.set('width', str(bar_width))
-                    rect_elem.set('height', str(height_asc))
-                elif bar == 'D':  # Descender
-                    rect_elem.set('x', str(x_pos))
-                    rect_elem.set('y', str(start_y + height_full - height_desc))
-                    rect_elem.set('width', str(bar_width))
-                    rect_elem.set('height', str(height_desc))
-                elif bar == 'T':  # Tracker
-                    rect_elem.set('x', str(x_pos))
-                    rect_elem.set('y', str(y_tracker))
-                    rect_elem.set('width', str(bar_width))
-                    rect_elem.set('height', str(tracker_height))
-                
-                parent.append(rect_elem)
-                x_pos += bar_width + space
+            # Insert the barcode for this page as a single path
+            _emit_barcode(parent, g_tag, path_tag, barcode_data, start_x, start_y,
+                          bar_width, space, height_full, height_asc, height_desc, tracker_height)
     else:
         # No auspost rects found - add barcode at specified or default position
         if position is None:
@@ -304,58 +425,22 @@ def insert_barcode_into_svg(input_svg_path, barcode_data, output_svg_path=None,
         
         start_x = position[0] + (rect_width - total_barcode_width) / 2
         start_y = position[1] + (rect_height - height_full) / 2
-        y_tracker = start_y + (height_full - tracker_height) / 2
         
-        # Insert barcode rects directly into root
-        x_pos = start_x
-        for bar in bars:
-            # Create rect element with proper namespace
-            if svg_namespace:
-                rect_elem = ET.Element('{' + svg_namespace + '}rect')
-            else:
-                rect_elem = ET.Element('rect')
-            # Set fill color as requested - using style attribute for better compatibility
-            rect_elem.set('style', 'fill:#CCCCCCFF;fill-opacity:1')
-            # Also set as attribute for maximum compatibility
-            rect_elem.set('fill', '#CCCCCCFF')
-            
-            if bar == 'F':  # Full
-                rect_elem.set('x', str(x_pos))
-                rect_elem.set('y', str(start_y))
-                rect_elem.set('width', str(bar_width))
-                rect_elem.set('height', str(height_full))
-            elif bar == 'A':  # Ascender
-                rect_elem.set('x', str(x_pos))
-                rect_elem.set('y', str(start_y))
-                rect_elem.set('width', str(bar_width))
-                rect_elem.set('height', str(height_asc))
-            elif bar == 'D':  # Descender
-                rect_elem.set('x', str(x_pos))
-                rect_elem.set('y', str(start_y + height_full - height_desc))
-                rect_elem.set('width', str(bar_width))
-                rect_elem.set('height', str(height_desc))
-            elif bar == 'T':  # Tracker
-                rect_elem.set('x', str(x_pos))
-                rect_elem.set('y', str(y_tracker))
-                rect_elem.set('width', str(bar_width))
-                rect_elem.set('height', str(tracker_height))
-            
-            root.append(rect_elem)
-            x_pos += bar_width + space
+        # Insert the barcode directly into root as a single path
+        new_elems = [_emit_barcode(root, g_tag, path_tag, barcode_data, start_x, start_y,
+                                   bar_width, space, height_full, height_asc, height_desc, tracker_height)]
         
         # Add label text below barcode if label_text is provided
         if label_text:
-            if svg_namespace:
-                text_elem = ET.Element('{' + svg_namespace + '}text')
-            else:
-                text_elem = ET.Element('text')
-            text_elem.set('x', str(start_x))
-            text_elem.set('y', str(start_y + height_full + 15))
-            text_elem.set('font-family', 'Arial, sans-serif')
-            text_elem.set('font-size', '12')
-            text_elem.set('fill', '#000000')
+            text_elem = ET.SubElement(root, text_tag, {
+                'x': str(start_x),
+                'y': str(start_y + height_full + 15),
+                'font-family': 'Arial, sans-serif',
+                'font-size': '12',
+                'fill': '#000000',
+            })
             text_elem.text = label_text
-            root.append(text_elem)
+            new_elems.append(text_elem)
     
     # Update ALL existing text elements with label "auspost_label" (one per page)
     for auspost_label_text in auspost_label_texts:
@@ -364,51 +449,513 @@ def insert_barcode_into_svg(input_svg_path, barcode_data, output_svg_path=None,
         
         # Clear any existing text content from the text element itself
         auspost_label_text.text = None
-        # Find the tspan element inside the text element and update it
-        tspan_found = False
-        for tspan in auspost_label_text.iter():
-            tspan_tag = tspan.tag.split('}')[-1] if '}' in tspan.tag else tspan.tag
-            if tspan_tag == 'tspan':
-                # Update the text content in the tspan
-                tspan.text = display_text
-                tspan_found = True
-                break
-        # If no tspan found, create one or set text directly
-        if not tspan_found:
-            # Create a tspan element if it doesn't exist
-            if svg_namespace:
-                tspan_elem = ET.Element('{' + svg_namespace + '}tspan')
-            else:
-                tspan_elem = ET.Element('tspan')
-            tspan_elem.text = display_text
-            auspost_label_text.append(tspan_elem)
-    
-    # Save the modified SVG
-    # Pretty print the XML
-    xml_str = ET.tostring(root, encoding='unicode')
-    dom = minidom.parseString(xml_str)
-    pretty_xml = dom.toprettyxml(indent="  ")
-    
-    # Remove the XML declaration line added by minidom if the original didn't have it
-    with open(input_svg_path, 'r', encoding='utf-8') as f:
-        original_content = f.read()
-        has_xml_declaration = original_content.strip().startswith('<?xml')
-    
-    if not has_xml_declaration:
-        # Remove the XML declaration
-        lines = pretty_xml.split('\n')
-        if lines[0].startswith('<?xml'):
-            pretty_xml = '\n'.join(lines[1:])
-    
-    with open(output_svg_path, 'w', encoding='utf-8') as f:
-        f.write(pretty_xml)
+        # Update the first tspan inside the text element, or create one
+        tspan = auspost_label_text.find('.//' + tspan_tag)
+        if tspan is not None:
+            tspan.text = display_text
+        else:
+            ET.SubElement(auspost_label_text, tspan_tag).text = display_text
+    
+    # No original element was modified, so write the original bytes with the
+    # new elements spliced in before the root's end tag instead of
+    # serializing the whole tree, when that end tag can be located
+    close = None
+    if not auspost_rects and not auspost_label_texts:
+        close = _root_end_tag_offset(original_bytes, root)
+    if close is not None:
+        markup = ''.join(_element_markup(e, svg_namespace) for e in new_elems)
+        with open(output_svg_path, 'wb') as f:
+            f.write(original_bytes[:close])
+            f.write(markup.encode('ascii', 'xmlcharrefreplace'))
+            f.write(b'\n')
+            f.write(original_bytes[close:])
+        return
+    
+    # Keep the XML declaration only if the original had one
+    has_xml_declaration = original_bytes[:64].lstrip().startswith(b'<?xml')
+    
+    # Save the modified SVG, re-indenting it only on request
+    if pretty:
+        ET.indent(tree, space="  ")
+    tree.write(output_svg_path, encoding='utf-8', xml_declaration=has_xml_declaration)
 
 # Example usage:
 # generate_4state_barcode_svg("HELLO123", "hello_barcode.svg")
 # insert_barcode_into_svg("template.svg", "HELLO123", "output.svg")
 
 
-def sign_pdf_with_barcodes(pdf_path, csv_path='v4_uuids.csv', output_path=None, output_dir=None, template_svg_path='calibration_page-coloured.svg'):
+def _element_path(elem, parent_map):
+    """Return the child indices leading from the root to elem, or None if elem is None."""
+    if elem is None:
+        return None
+    path = []
+    parent = parent_map.get(elem)
+    while parent is not None:
+        path.append(list(parent).index(elem))
+        elem, parent = parent, parent_map.get(parent)
+    return path[::-1]
+
+
+def _resolve_path(root, path):
+    """Follow child indices from _element_path back to the element in a copy of the tree."""
+    if path is None:
+        return None
+    elem = root
+    for i in path:
+        elem = elem[i]
+    return elem
+
+
+def _load_page_template(page_template_path, template_page_label, page_parity):
+    """
+    Parse a page template and locate its auspost rect and auspost_label text.
+    
+    Args:
+        page_template_path: Path to the template SVG
+        template_page_label: Inkscape label of the page layer ("page 0" or "page 1")
+        page_parity: 0 for even pages, 1 for odd pages (selects the meta layer)
+    
+    Returns:
+        dict: The parsed tree with the SVG size, the auspost box and label
+        position in SVG coordinates, the index path to the label text and
+        whether the file starts with an XML declaration
+    """
+    # Read template SVG to get auspost rect position and render as background
+    with open(page_template_path, 'rb') as f:
+        data = f.read()
+    tree = _parse_svg(data)
+    root = tree.getroot()
+    
+    # Get SVG dimensions
+    svg_width, svg_height = _svg_size(root, 816, 1056)
+    
+    # Find auspost rect and auspost_label text in the appropriate template page.
+    # One pass classifies the page layer, this page's meta layers (layer1,
+    # layer4) and every auspost candidate, and builds the parent map
+    meta_page, meta_id = ('page 0', 'layer1') if page_parity == 0 else ('page 1', 'layer4')
+    parent_map = {}
+    target_page_layer = None
+    meta_layers = []
+    rect_candidates = []
+    label_candidates = []
+    for elem in root.iter():
+        for child in elem:
+            parent_map[child] = elem
+        tag = elem.tag.rpartition('}')[2]
+        if tag == 'g':
+            elem_id = elem.get('id', '')
+            inkscape_label = elem.get(_INK_LABEL)
+            if target_page_layer is None and (elem_id in ('layer2', 'layer3') or inkscape_label == template_page_label):
+                target_page_layer = elem
+            # Check for meta layers (page 0 meta, page 1 meta) matching our page
+            if elem_id in ('layer1', 'layer4') or (inkscape_label and 'meta' in inkscape_label):
+                if meta_page in str(inkscape_label) or elem_id == meta_id:
+                    meta_layers.append(elem)
+        elif tag == 'rect':
+            if elem.get('id') == 'auspost' or elem.get(_INK_LABEL) == 'auspost':
+                rect_candidates.append(elem)
+        elif tag == 'text':
+            if elem.get(_INK_LABEL) == 'auspost_label':
+                label_candidates.append(elem)
+    
+    def within(elem, layer):
+        while elem is not None:
+            if elem is layer:
+                return True
+            elem = parent_map.get(elem)
+        return False
+    
+    # Meta layers take priority over the page layer, later layers over earlier
+    # ones, and later matches within a layer over earlier ones
+    search_layers = ([target_page_layer] if target_page_layer is not None else []) + meta_layers
+    def pick(candidates):
+        for layer in reversed(search_layers):
+            inside = [c for c in candidates if within(c, layer)]
+            if inside:
+                return inside[-1]
+        return None
+    
+    auspost_rect = pick(rect_candidates)
+    auspost_label_text = pick(label_candidates)
+    
+    # Fallback: if still not found, take the last matches in the entire document
+    if auspost_rect is None:
+        auspost_rect = rect_candidates[-1] if rect_candidates else None
+        if label_candidates:
+            auspost_label_text = label_candidates[-1]
+    
+    if auspost_rect is None:
+        raise ValueError("Could not find 'auspost' rect in template SVG")
+    
+    # Get auspost rect position and dimensions
+    auspost_x = float(auspost_rect.get('x', 0))
+    auspost_y = float(auspost_rect.get('y', 0))
+    auspost_width = float(auspost_rect.get('width', 200))
+    auspost_height = float(auspost_rect.get('height', 50))
+    
+    # Check if the parent layer has a transform that affects coordinates
+    # For calibration_page-coloured-1.svg, layer3 and layer4 have transform="translate(-880)"
+    # We need to find the transform by checking parent layers
+    # Find the nearest layer (g element) that contains the auspost_rect
+    parent_layer = parent_map.get(auspost_rect)
+    while parent_layer is not None and parent_layer.tag.rpartition('}')[2] != 'g':
+        parent_layer = parent_map.get(parent_layer)
+    
+    # Check for transform in parent layer and apply it
+    label_transform_x = 0
+    label_transform_y = 0
+    if parent_layer is not None:
+        transform_attr = parent_layer.get('transform', '')
+        if transform_attr and 'translate' in transform_attr:
+            # Extract translate values (e.g., "translate(-880)" or "translate(-880, 0)")
+            match = _TRANSLATE_RE.search(transform_attr)
+            if match:
+                translate_x = float(match.group(1))
+                translate_y = float(match.group(2) or 0)
+                auspost_x += translate_x
+                auspost_y += translate_y
+                # Store transform for label text adjustment
+                label_transform_x = translate_x
+                label_transform_y = translate_y
+    
+    # Qualified tspan name, kept with the template so pages need not derive it again
+    tspan_tag = _svg_qname(root, 'tspan')
+    
+    # Get auspost_label text position if it exists
+    label_x = None
+    label_y = None
+    if auspost_label_text is not None:
+        label_x = float(auspost_label_text.get('x', auspost_x))
+        label_y = float(auspost_label_text.get('y', auspost_y + auspost_height + 15))
+        # Check for tspan inside text element
+        tspan = auspost_label_text.find('.//' + tspan_tag)
+        if tspan is not None:
+            tspan_x = tspan.get('x')
+            tspan_y = tspan.get('y')
+            if tspan_x is not None:
+                label_x = float(tspan_x)
+            if tspan_y is not None:
+                label_y = float(tspan_y)
+        # Apply the same transform to label coordinates
+        label_x += label_transform_x
+        label_y += label_transform_y
+    
+    return {
+        'tree': tree,
+        'size': (svg_width, svg_height),
+        'auspost': (auspost_x, auspost_y, auspost_width, auspost_height),
+        'label_pos': (label_x, label_y),
+        'label_path': _element_path(auspost_label_text, parent_map),
+        'tspan_tag': tspan_tag,
+        'xml_declaration': data[:64].lstrip().startswith(b'<?xml'),
+        # Filled in by the first _sign_page call: rendered underlay and the
+        # page band holding the label, the only part that changes per page
+        'background': None,
+        'label_band': None,
+    }
+
+
+# Per-process state for _sign_page: the source PDF and the parsed templates
+_worker_doc = None
+_worker_templates = {}
+
+# Template underlay raster: RGB because the calibration marks are coloured, 2x for sharp fiducials
+_TEMPLATE_MATRIX = fitz.Matrix(2.0, 2.0) if HAS_PYMUPDF else None
+
+
+def _init_sign_worker(pdf_path):
+    """Open the source PDF once per worker process."""
+    global _worker_doc
+    _worker_doc = fitz.open(pdf_path)
+    _worker_templates.clear()
+
+
+def _build_signed_page(task):
+    """
+    Build the signed version of one PDF page from the worker's open source PDF.
+    
+    Args:
+        task: (page_num, selected_uuid, page_template_path, template_page_label) tuple
+    
+    Returns:
+        fitz.Document: A new single-page document holding the signed page
+    """
+    page_num, selected_uuid, page_template_path, template_page_label = task
+    
+    # Get the PDF page (preserve vector content)
+    page = _worker_doc[page_num]
+    page_rect = page.rect
+    page_width, page_height = page_rect.width, page_rect.height
+    
+    # Parse each template once per worker and reuse it for every page with the same parity
+    template_key = (page_template_path, page_num % 2)
+    if template_key not in _worker_templates:
+        _worker_templates[template_key] = _load_page_template(page_template_path, template_page_label, page_num % 2)
+    template = _worker_templates[template_key]
+    svg_width, svg_height = template['size']
+    auspost_x, auspost_y, auspost_width, auspost_height = template['auspost']
+    label_x, label_y = template['label_pos']
+    
+    # Work on a copy so the cached tree stays unmodified
+    root = copy.deepcopy(template['tree'].getroot())
+    auspost_label_text = _resolve_path(root, template['label_path'])
+    
+    # Calculate scaling factor from SVG to PDF page
+    scale_x = page_width / svg_width
+    scale_y = page_height / svg_height
+    
+    # Scale auspost position to PDF coordinates
+    pdf_auspost_x = auspost_x * scale_x
+    pdf_auspost_y = auspost_y * scale_y
+    pdf_auspost_width = auspost_width * scale_x
+    pdf_auspost_height = auspost_height * scale_y
+    
+    # Scale label position to PDF coordinates
+    pdf_label_x = label_x * scale_x if label_x is not None else None
+    pdf_label_y = label_y * scale_y if label_y is not None else None
+    
+    # Update the label text in the SVG template (so it's part of the background image and non-selectable)
+    if auspost_label_text is not None:
+        # Set font on the parent text element
+        text_style = auspost_label_text.get('style', '')
+        if text_style:
+            # Override font-family in text element, or add it if missing
+            text_style, n = _FONT_FAMILY_RE.subn(_FONT_FAMILY_DECL, text_style)
+            if n == 0:
+                if not text_style.endswith(';'):
+                    text_style += ';'
+                text_style += _FONT_FAMILY_DECL
+            auspost_label_text.set('style', text_style)
+        else:
+            # Create style for text element
+            auspost_label_text.set('style', _DEFAULT_TEXT_STYLE)
+        
+        # Also set font-family as a direct attribute
+        auspost_label_text.set('font-family', DEFAULT_FONT_FAMILY)
+        
+        # Find existing tspan and update its text content
+        tspan_tag = template['tspan_tag']
+        tspan = auspost_label_text.find('.//' + tspan_tag)
+        if tspan is not None:
+            tspan.text = selected_uuid
+            tspan.tail = None
+            
+            # Ensure style attribute has font-family
+            original_style = tspan.get('style', '')
+            if original_style:
+                original_style, n = _FONT_FAMILY_RE.subn(_FONT_FAMILY_DECL, original_style)
+                if n == 0:
+                    if not original_style.endswith(';'):
+                        original_style += ';'
+                    original_style += _FONT_FAMILY_DECL
+                tspan.set('style', original_style)
+            else:
+                # Create style with defaults
+                tspan.set('style', _DEFAULT_TEXT_STYLE)
+        else:
+            # No tspan found, so create one positioned like its text element
+            tspan_attrib = {k: auspost_label_text.get(k) for k in ('x', 'y') if auspost_label_text.get(k)}
+            ET.SubElement(auspost_label_text, tspan_tag, tspan_attrib).text = selected_uuid
+    
+    # Render template as background image (underlay). The first page renders it
+    # in full; later pages reuse that raster and re-render only the label band
+    background = template['background']
+    if background is not None and template['label_band'] is None:
+        # No label, so every page's underlay is identical
+        template_pix = background
+    else:
+        svg_bytes = ET.tostring(root, encoding='utf-8', xml_declaration=template['xml_declaration'])
+        template_doc = fitz.open(stream=svg_bytes, filetype='svg')
+        template_page = template_doc[0]
+        if background is None:
+            template_pix = template_page.get_pixmap(matrix=_TEMPLATE_MATRIX, colorspace=fitz.csRGB, alpha=False)
+            label_hits = template_page.search_for(selected_uuid) if auspost_label_text is not None else []
+            if auspost_label_text is None or label_hits:
+                template['background'] = template_pix
+            if label_hits:
+                # Full-width band around the label with a label height of margin, on the pixel grid
+                label_rect = label_hits[0]
+                zoom = _TEMPLATE_MATRIX.a
+                template['label_band'] = fitz.Rect(
+                    0, math.floor((label_rect.y0 - label_rect.height) * zoom) / zoom,
+                    template_page.rect.width, math.ceil((label_rect.y1 + label_rect.height) * zoom) / zoom,
+                ) & template_page.rect
+        else:
+            band_pix = template_page.get_pixmap(matrix=_TEMPLATE_MATRIX, colorspace=fitz.csRGB, alpha=False,
+                                                clip=template['label_band'])
+            template_pix = fitz.Pixmap(background, 0)
+            template_pix.copy(band_pix, band_pix.irect)
+        template_doc.close()
+    
+    # Create new PDF page with template as background
+    new_doc = fitz.open()
+    new_page = new_doc.new_page(width=page_width, height=page_height)
+    
+    # Insert template as background image (underlay) - this includes the label text as part of the image
+    page_area = fitz.Rect(0, 0, page_width, page_height)
+    new_page.insert_image(page_area, pixmap=template_pix)
+    
+    # Encode the barcode BEFORE overlaying PDF (so we have the dimensions)
+    uuid_for_barcode = selected_uuid.replace('-', '')
+    # The cached bar string is all that is needed here; no per-call list copy
+    num_bars = len(_encode_bars(uuid_for_barcode))
+    
+    # Calculate barcode dimensions to fit in auspost area
+    # Make bars thinner with more spacing for better legibility
+    available_width = pdf_auspost_width * 0.95
+    # Make bars thinner by increasing the divisor
+    bar_width = (available_width * 0.85) / (num_bars * 3) if num_bars > 0 else 2.5
+    # Ensure minimum bar width for legibility
+    if bar_width < 1.5:
+        bar_width = 1.5
+    space = bar_width * 1.0  # More space between bars
+    total_barcode_width = num_bars * bar_width + (num_bars - 1) * space
+    
+    height_full = pdf_auspost_height * 0.9
+    height_asc = height_full * 0.8
+    height_desc = height_full * 0.8
+    tracker_height = height_full * 0.2
+    
+    # Center barcode in auspost area
+    barcode_start_x = pdf_auspost_x + (pdf_auspost_width - total_barcode_width) / 2
+    barcode_start_y = pdf_auspost_y + (pdf_auspost_height - height_full) / 2
+    y_tracker = barcode_start_y + (height_full - tracker_height) / 2
+    
+    # Draw barcode bars BEFORE overlaying PDF (so it's in the background)
+    # Use black color for maximum legibility
+    barcode_color = (0.6, 0.6, 0.6)  # Dark gray (RGB values must be 0.0-1.0)
+    # Collect all bars in one shape and emit them with a single fill
+    shape = new_page.new_shape()
+    data_u8 = np.frombuffer(uuid_for_barcode.encode('ascii', 'replace'), dtype=np.uint8)
+    xs, ys, hs = _encode_and_layout(data_u8, _BAR_CODES, float(barcode_start_x), float(barcode_start_y),
+                                    float(bar_width), float(space), float(height_full), float(height_asc),
+                                    float(height_desc), float(tracker_height), float(y_tracker))
+    for x, y, h in zip(xs.tolist(), ys.tolist(), hs.tolist()):
+        shape.draw_rect(fitz.Rect(x, y, x + bar_width, y + h))
+    shape.finish(color=barcode_color, fill=barcode_color)
+    shape.commit()
+    
+    # Overlay original PDF page content on top (preserving vector)
+    # Use show_pdf_page to insert the original page on top of background
+    new_page.show_pdf_page(page_area, _worker_doc, page_num)
+    
+    return new_doc
+
+
+def _sign_page(task):
+    """Build one signed page in a worker process and return it as PDF bytes."""
+    new_doc = _build_signed_page(task)
+    page_pdf = new_doc.tobytes()
+    new_doc.close()
+    return page_pdf
+
+
+# UUID CSV layout: a header row, then uuid, entity, state per row
+_CSV_FIELDS = ['uuid', 'entity', 'state']
+_UUID_COL, _ENTITY_COL, _STATE_COL = 0, 1, 2
+
+
+def _read_uuid_rows(csv_path):
+    """Read the UUID CSV as a list of [uuid, entity, state] rows, without the header."""
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [row for row in reader if row]
+
+
+def _write_uuid_rows(csv_path, rows):
+    """Write [uuid, entity, state] rows back to the UUID CSV under its header."""
+    # Build the whole file in memory so it is written with a single call
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(_CSV_FIELDS)
+    writer.writerows(rows)
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(buf.getvalue())
+
+
+def _read_free_index(csv_path):
+    """
+    Read the first-free-row pointer kept next to the CSV.
+    
+    Returns 0 (scan from the top) if the pointer is missing or unreadable, or
+    if the CSV has changed since the pointer was written.
+    """
+    try:
+        with open(csv_path + '.idx', 'r', encoding='utf-8') as f:
+            index, size, mtime_ns = (int(v) for v in f.read().split())
+        st = os.stat(csv_path)
+    except (OSError, ValueError):
+        return 0
+    return index if (st.st_size, st.st_mtime_ns) == (size, mtime_ns) else 0
+
+
+def _write_free_index(csv_path, index):
+    """Record that no row before index is free, tied to the CSV as just written."""
+    st = os.stat(csv_path)
+    with open(csv_path + '.idx', 'w', encoding='utf-8') as f:
+        f.write(f"{index} {st.st_size} {st.st_mtime_ns}\n")
+
+
+# UUID CSVs read by this process: absolute path -> {'rows', 'next_free', 'pending', 'stat'}.
+# The cache only saves re-parsing: every allocation is written back before the
+# signing call returns, and a CSV changed by anyone else is read again
+_csv_cache = {}
+
+
+def _csv_stat(csv_path):
+    """Return (size, mtime_ns) of a CSV, used to tell whether a cached copy is current."""
+    st = os.stat(csv_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _cached_uuid_rows(csv_path):
+    """Return the cache entry for a UUID CSV, (re)loading it and its free-row pointer if the file changed."""
+    key = os.path.abspath(csv_path)
+    stat = _csv_stat(csv_path)
+    entry = _csv_cache.get(key)
+    if entry is None or entry['stat'] != stat:
+        entry = _csv_cache[key] = {
+            'rows': _read_uuid_rows(csv_path),
+            'next_free': _read_free_index(csv_path),
+            'pending': 0,
+            'stat': stat,
+        }
+    return entry
+
+
+def _flush_uuid_rows(csv_path):
+    """Write a cached UUID CSV and its free-row pointer back if it has unsaved updates."""
+    entry = _csv_cache.get(os.path.abspath(csv_path))
+    if entry is not None and entry['pending']:
+        _write_uuid_rows(csv_path, entry['rows'])
+        _write_free_index(csv_path, entry['next_free'])
+        entry['pending'] = 0
+        entry['stat'] = _csv_stat(csv_path)
+
+
+def _free_rows(rows, start):
+    """
+    Yield indices of free rows (empty entity and state).
+    
+    Scanning starts at the pointer from _read_free_index and wraps around to
+    the rows before it, so a stale pointer only costs a longer scan.
+    """
+    if not 0 <= start <= len(rows):
+        start = 0
+    for i in itertools.chain(range(start, len(rows)), range(start)):
+        row = rows[i]
+        if not row[_ENTITY_COL].strip() and not row[_STATE_COL].strip():
+            yield i
+
+
+def _append_pdf_bytes(merged_doc, pdf_bytes):
+    """Append every page of an in-memory PDF to merged_doc."""
+    with fitz.open('pdf', pdf_bytes) as page_doc:
+        merged_doc.insert_pdf(page_doc)
+
+
+def sign_pdf_with_barcodes(pdf_path, csv_path='v4_uuids.csv', output_path=None, output_dir=None, template_svg_path='calibration_page-coloured.svg', workers=None):
     """
     Process a PDF document: overlay each page onto template SVG, add unique barcode to each, convert back to PDF, and merge.
     
@@ -416,11 +963,12 @@ def sign_pdf_with_barcodes(pdf_path, csv_path='v4_uuids.csv', output_path=None,
         pdf_path: Path to the input PDF file
         csv_path: Path to the v4_uuids.csv file
         output_path: Path for the final merged PDF (defaults to input name with '_signed' suffix)
-        output_dir: Directory for temporary files (defaults to same as PDF)
+        output_dir: Directory for the output PDF when output_path is not given (defaults to same as PDF)
         template_svg_path: Path to the calibration template SVG (default: calibration_page-coloured.svg)
+        workers: Number of worker processes for the pages (default: CPU count; 1 runs in-process)
     
     Returns:
-        tuple: (output_path, list of (page_num, uuid, temp_pdf_path) tuples)
+        tuple: (output_path, list of (page_num, uuid) tuples)
     """
     if not HAS_PYMUPDF:
         raise ImportError("PyMuPDF (fitz) is required. Install with: pip install PyMuPDF")
@@ -438,450 +986,84 @@ def sign_pdf_with_barcodes(pdf_path, csv_path='v4_uuids.csv', output_path=None,
         base_name = os.path.splitext(os.path.basename(pdf_path))[0]
         output_path = os.path.join(output_dir, f"{base_name}_signed.pdf")
     
-    # Read the CSV file
-    rows = []
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
+    # Read the CSV file (shared with sign_with_next_uuid in this process)
+    csv_entry = _cached_uuid_rows(csv_path)
+    rows = csv_entry['rows']
     
-    # Open the PDF
-    doc = fitz.open(pdf_path)
-    num_pages = len(doc)
+    # Count the PDF pages; the workers open it themselves
+    with fitz.open(pdf_path) as doc:
+        num_pages = len(doc)
     
     signed_pages = []
-    temp_files = []
+    tasks = []
     
-    try:
-        # Process each page by overlaying onto template
-        for page_num in range(num_pages):
-            # Find next available UUID
-            selected_uuid = None
-            selected_index = None
-            for i, row in enumerate(rows):
-                if not row.get('entity', '').strip() and not row.get('state', '').strip():
-                    selected_uuid = row['uuid']
-                    selected_index = i
-                    break
-            
-            if selected_uuid is None:
-                print(f"Warning: No more UUIDs available for page {page_num + 1}")
-                break
-            
-            # Get the PDF page (preserve vector content)
-            page = doc[page_num]
-            page_rect = page.rect
-            
-            # Select the correct template file based on even/odd page numbers
-            # Odd pages (1, 3, 5...) → calibration_page-coloured-1.svg (which has "page 1")
-            # Even pages (0, 2, 4...) → calibration_page-coloured-0.svg (which has "page 0")
-            if page_num % 2 == 1:  # Odd page (1-indexed: 1, 3, 5...)
-                page_template_path = 'calibration_page-coloured-1.svg'
-                template_page_label = "page 1"
-            else:  # Even page (0-indexed: 0, 2, 4...)
-                page_template_path = 'calibration_page-coloured-0.svg'
-                template_page_label = "page 0"
-            
-            # Check if the page-specific template exists, fallback to default template
-            if not os.path.exists(page_template_path):
-                if os.path.exists(template_svg_path):
-                    page_template_path = template_svg_path
-                else:
-                    raise FileNotFoundError(f"Template SVG not found: {page_template_path} or {template_svg_path}")
-            
-            # Read template SVG to get auspost rect position and render as background
-            tree = ET.parse(page_template_path)
-            root = tree.getroot()
-            
-            # Get SVG dimensions - try viewBox first (most reliable)
-            if 'viewBox' in root.attrib:
-                viewbox_parts = root.attrib['viewBox'].split()
-                if len(viewbox_parts) >= 4:
-                    svg_width = float(viewbox_parts[2])
-                    svg_height = float(viewbox_parts[3])
-                else:
-                    # Fallback to width/height attributes
-                    width_attr = root.get('width', '816')
-                    height_attr = root.get('height', '1056')
-                    # Handle units like '8.5in'
-                    if 'in' in str(width_attr):
-                        svg_width = float(str(width_attr).replace('in', '').strip()) * 96
-                    else:
-                        svg_width = float(width_attr)
-                    if 'in' in str(height_attr):
-                        svg_height = float(str(height_attr).replace('in', '').strip()) * 96
-                    else:
-                        svg_height = float(height_attr)
-            else:
-                # Parse width/height attributes with unit handling
-                width_attr = root.get('width', '816')
-                height_attr = root.get('height', '1056')
-                # Handle units like '8.5in'
-                if 'in' in str(width_attr):
-                    svg_width = float(str(width_attr).replace('in', '').strip()) * 96
-                else:
-                    svg_width = float(width_attr)
-                if 'in' in str(height_attr):
-                    svg_height = float(str(height_attr).replace('in', '').strip()) * 96
-                else:
-                    svg_height = float(height_attr)
-            
-            # Find auspost rect and auspost_label text in the appropriate template page
-            auspost_rect = None
-            auspost_label_text = None
-            target_page_layer = None
-            
-            # First, find the target page layer
-            for elem in root.iter():
-                tag = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                if tag == 'g':
-                    elem_id = elem.get('id', '')
-                    inkscape_label = None
-                    for attr_name, attr_value in elem.attrib.items():
-                        if attr_name.endswith('label') and attr_value == template_page_label:
-                            inkscape_label = attr_value
-                            break
-                    if elem_id in ['layer2', 'layer3'] or inkscape_label == template_page_label:
-                        target_page_layer = elem
-                        break
-            
-            # Search for auspost elements - check both the page layer and meta layers
-            def find_auspost_elements(elem):
-                nonlocal auspost_rect, auspost_label_text
-                tag = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                if tag == 'rect':
-                    elem_id = elem.get('id', '')
-                    inkscape_label = None
-                    for attr_name, attr_value in elem.attrib.items():
-                        if attr_name.endswith('label') and attr_value == 'auspost':
-                            inkscape_label = attr_value
-                            break
-                    if elem_id == 'auspost' or inkscape_label == 'auspost':
-                        auspost_rect = elem
-                elif tag == 'text':
-                    inkscape_label = None
-                    for attr_name, attr_value in elem.attrib.items():
-                        if attr_name.endswith('label') and attr_value == 'auspost_label':
-                            inkscape_label = attr_value
-                            break
-                    if inkscape_label == 'auspost_label':
-                        auspost_label_text = elem
-                for child in elem:
-                    find_auspost_elements(child)
-            
-            # Search in the target page layer if found
-            if target_page_layer is not None:
-                find_auspost_elements(target_page_layer)
-            
-            # Also search in meta layers (layer1, layer4) which contain auspost elements
-            for elem in root.iter():
-                tag = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                if tag == 'g':
-                    elem_id = elem.get('id', '')
-                    inkscape_label = None
-                    for attr_name, attr_value in elem.attrib.items():
-                        if attr_name.endswith('label'):
-                            inkscape_label = attr_value
-                            break
-                    # Check for meta layers (page 0 meta, page 1 meta)
-                    if elem_id in ['layer1', 'layer4'] or (inkscape_label and 'meta' in inkscape_label):
-                        # Check if this meta layer matches our page
-                        if (page_num % 2 == 0 and ('page 0' in str(inkscape_label) or elem_id == 'layer1')) or \
-                           (page_num % 2 == 1 and ('page 1' in str(inkscape_label) or elem_id == 'layer4')):
-                            find_auspost_elements(elem)
-            
-            # Fallback: if still not found, search entire document
-            if auspost_rect is None:
-                find_auspost_elements(root)
-            
-            if auspost_rect is None:
-                raise ValueError("Could not find 'auspost' rect in template SVG")
-            
-            # Get auspost rect position and dimensions
-            auspost_x = float(auspost_rect.get('x', 0))
-            auspost_y = float(auspost_rect.get('y', 0))
-            auspost_width = float(auspost_rect.get('width', 200))
-            auspost_height = float(auspost_rect.get('height', 50))
-            
-            # Check if the parent layer has a transform that affects coordinates
-            # For calibration_page-coloured-1.svg, layer3 and layer4 have transform="translate(-880)"
-            # We need to find the transform by checking parent layers
-            import re
-            # Find the parent layer (g element) that contains the auspost_rect
-            parent_layer = None
-            for elem in root.iter():
-                if elem == auspost_rect:
-                    continue
-                # Check if auspost_rect is a child of this element
-                for child in elem:
-                    if child == auspost_rect:
-                        tag = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                        if tag == 'g':
-                            parent_layer = elem
-                            break
-                if parent_layer is not None:
-                    break
-            
-            # Check for transform in parent layer and apply it
-            label_transform_x = 0
-            label_transform_y = 0
-            if parent_layer is not None:
-                transform_attr = parent_layer.get('transform', '')
-                if transform_attr and 'translate' in transform_attr:
-                    # Extract translate values (e.g., "translate(-880)" or "translate(-880, 0)")
-                    match = re.search(r'translate\(([^)]+)\)', transform_attr)
-                    if match:
-                        translate_values = match.group(1).split(',')
-                        translate_x = float(translate_values[0].strip())
-                        translate_y = float(translate_values[1].strip()) if len(translate_values) > 1 else 0
-                        auspost_x += translate_x
-                        auspost_y += translate_y
-                        # Store transform for label text adjustment
-                        label_transform_x = translate_x
-                        label_transform_y = translate_y
-            
-            # Get auspost_label text position if it exists
-            label_x = None
-            label_y = None
-            if auspost_label_text is not None:
-                label_x = float(auspost_label_text.get('x', auspost_x))
-                label_y = float(auspost_label_text.get('y', auspost_y + auspost_height + 15))
-                # Check for tspan inside text element
-                for tspan in auspost_label_text.iter():
-                    tspan_tag = tspan.tag.split('}')[-1] if '}' in tspan.tag else tspan.tag
-                    if tspan_tag == 'tspan':
-                        tspan_x = tspan.get('x')
-                        tspan_y = tspan.get('y')
-                        if tspan_x is not None:
-                            label_x = float(tspan_x)
-                        if tspan_y is not None:
-                            label_y = float(tspan_y)
-                        break
-                # Apply the same transform to label coordinates
-                label_x += label_transform_x
-                label_y += label_transform_y
-            
-            # Calculate scaling factor from SVG to PDF page
-            scale_x = page_rect.width / svg_width
-            scale_y = page_rect.height / svg_height
-            
-            # Scale auspost position to PDF coordinates
-            pdf_auspost_x = auspost_x * scale_x
-            pdf_auspost_y = auspost_y * scale_y
-            pdf_auspost_width = auspost_width * scale_x
-            pdf_auspost_height = auspost_height * scale_y
-            
-            # Scale label position to PDF coordinates
-            pdf_label_x = label_x * scale_x if label_x is not None else None
-            pdf_label_y = label_y * scale_y if label_y is not None else None
-            
-            # Hardcoded default font style as backup (used for SVG background)
-            # Change DEFAULT_FONT_FAMILY to your desired font
-            DEFAULT_FONT_FAMILY = 'Space Mono'  # Font name for SVG
-            DEFAULT_FONT_SIZE = '13.3333px'
-            DEFAULT_FILL_COLOR = '#cccccc'
-            
-            # Update the label text in the SVG template (so it's part of the background image and non-selectable)
-            if auspost_label_text is not None:
-                import re
-                # Set font on the parent text element
-                text_style = auspost_label_text.get('style', '')
-                if text_style:
-                    # Ensure font-family is in text element style
-                    if 'font-family' not in text_style:
-                        if text_style and not text_style.endswith(';'):
-                            text_style += ';'
-                        text_style += f'font-family:{DEFAULT_FONT_FAMILY}'
-                    else:
-                        # Override font-family in text element
-                        text_style = re.sub(r'font-family:[^;]+', f'font-family:{DEFAULT_FONT_FAMILY}', text_style)
-                    auspost_label_text.set('style', text_style)
-                else:
-                    # Create style for text element
-                    text_style_parts = [
-                        f'font-size:{DEFAULT_FONT_SIZE}',
-                        f'font-family:{DEFAULT_FONT_FAMILY}',
-                        f'fill:{DEFAULT_FILL_COLOR}',
-                        f'fill-opacity:1'
-                    ]
-                    auspost_label_text.set('style', ';'.join(text_style_parts))
-                
-                # Also set font-family as a direct attribute
-                auspost_label_text.set('font-family', DEFAULT_FONT_FAMILY)
-                
-                # Find existing tspan and update its text content
-                tspan_found = False
-                for tspan in auspost_label_text.iter():
-                    tag_name = tspan.tag.split('}')[-1] if '}' in tspan.tag else tspan.tag
-                    if tag_name == 'tspan':
-                        # Update text content
-                        tspan.text = selected_uuid
-                        tspan.tail = None
-                        
-                        # Ensure style attribute has font-family
-                        original_style = tspan.get('style', '')
-                        if original_style:
-                            original_style = re.sub(r'font-family:[^;]+', f'font-family:{DEFAULT_FONT_FAMILY}', original_style)
-                            if 'font-family' not in original_style:
-                                if original_style and not original_style.endswith(';'):
-                                    original_style += ';'
-                                original_style += f'font-family:{DEFAULT_FONT_FAMILY}'
-                            tspan.set('style', original_style)
-                        else:
-                            # Create style with defaults
-                            style_parts = [
-                                f'font-size:{DEFAULT_FONT_SIZE}',
-                                f'font-family:{DEFAULT_FONT_FAMILY}',
-                                f'fill:{DEFAULT_FILL_COLOR}',
-                                f'fill-opacity:1'
-                            ]
-                            tspan.set('style', ';'.join(style_parts))
-                        tspan_found = True
-                        break
-                
-                # If no tspan found, create one
-                if not tspan_found:
-                    svg_namespace = None
-                    if root.tag.startswith('{'):
-                        svg_namespace = root.tag.split('}')[0].strip('{')
-                    else:
-                        svg_namespace = root.attrib.get('xmlns', 'http://www.w3.org/2000/svg')
-                    
-                    if svg_namespace:
-                        tspan_elem = ET.Element('{' + svg_namespace + '}tspan')
-                    else:
-                        tspan_elem = ET.Element('tspan')
-                    
-                    tspan_x = auspost_label_text.get('x')
-                    tspan_y = auspost_label_text.get('y')
-                    if tspan_x:
-                        tspan_elem.set('x', tspan_x)
-                    if tspan_y:
-                        tspan_elem.set('y', tspan_y)
-                    
-                    tspan_elem.text = selected_uuid
-                    auspost_label_text.append(tspan_elem)
-            
-            # Render template as background image (underlay)
-            # Save template to temp file for rendering
-            temp_template_svg = os.path.join(output_dir, f"temp_template_{page_num}.svg")
-            xml_str = ET.tostring(root, encoding='unicode')
-            dom = minidom.parseString(xml_str)
-            pretty_xml = dom.toprettyxml(indent="  ")
-            with open(page_template_path, 'r', encoding='utf-8') as f:
-                original_content = f.read()
-                has_xml_declaration = original_content.strip().startswith('<?xml')
-            if not has_xml_declaration:
-                lines = pretty_xml.split('\n')
-                if lines[0].startswith('<?xml'):
-                    pretty_xml = '\n'.join(lines[1:])
-            with open(temp_template_svg, 'w', encoding='utf-8') as f:
-                f.write(pretty_xml)
-            temp_files.append(temp_template_svg)
-            
-            # Render template SVG to pixmap for background
-            zoom = 2.0
-            mat = fitz.Matrix(zoom, zoom)
-            template_doc = fitz.open(temp_template_svg)
-            template_page = template_doc[0]
-            template_pix = template_page.get_pixmap(matrix=mat)
-            template_doc.close()
-            
-            # Create new PDF page with template as background
-            temp_pdf = os.path.join(output_dir, f"temp_page_{page_num}.pdf")
-            new_doc = fitz.open()
-            new_page = new_doc.new_page(width=page_rect.width, height=page_rect.height)
-            
-            # Insert template as background image (underlay) - this includes the label text as part of the image
-            new_page.insert_image(fitz.Rect(0, 0, page_rect.width, page_rect.height), pixmap=template_pix)
-            
-            # Encode the barcode BEFORE overlaying PDF (so we have the dimensions)
-            uuid_for_barcode = selected_uuid.replace('-', '')
-            bars = encode_4state_barcode(uuid_for_barcode)
-            num_bars = len(bars)
-            
-            # Calculate barcode dimensions to fit in auspost area
-            # Make bars thinner with more spacing for better legibility
-            available_width = pdf_auspost_width * 0.95
-            # Make bars thinner by increasing the divisor
-            bar_width = (available_width * 0.85) / (num_bars * 3) if num_bars > 0 else 2.5
-            # Ensure minimum bar width for legibility
-            if bar_width < 1.5:
-                bar_width = 1.5
-            space = bar_width * 1.0  # More space between bars
-            total_barcode_width = num_bars * bar_width + (num_bars - 1) * space
-            
-            height_full = pdf_auspost_height * 0.9
-            height_asc = height_full * 0.8
-            height_desc = height_full * 0.8
-            tracker_height = height_full * 0.2
-            
-            # Center barcode in auspost area
-            barcode_start_x = pdf_auspost_x + (pdf_auspost_width - total_barcode_width) / 2
-            barcode_start_y = pdf_auspost_y + (pdf_auspost_height - height_full) / 2
-            y_tracker = barcode_start_y + (height_full - tracker_height) / 2
-            
-            # Draw barcode bars BEFORE overlaying PDF (so it's in the background)
-            # Use black color for maximum legibility
-            barcode_color = (0.6, 0.6, 0.6)  # Dark gray (RGB values must be 0.0-1.0)
-            x_pos = barcode_start_x
-            for bar in bars:
-                if bar == 'F':  # Full
-                    rect = fitz.Rect(x_pos, barcode_start_y, x_pos + bar_width, barcode_start_y + height_full)
-                    new_page.draw_rect(rect, color=barcode_color, fill=barcode_color)
-                elif bar == 'A':  # Ascender
-                    rect = fitz.Rect(x_pos, barcode_start_y, x_pos + bar_width, barcode_start_y + height_asc)
-                    new_page.draw_rect(rect, color=barcode_color, fill=barcode_color)
-                elif bar == 'D':  # Descender
-                    rect = fitz.Rect(x_pos, barcode_start_y + height_full - height_desc, x_pos + bar_width, barcode_start_y + height_full)
-                    new_page.draw_rect(rect, color=barcode_color, fill=barcode_color)
-                elif bar == 'T':  # Tracker
-                    rect = fitz.Rect(x_pos, y_tracker, x_pos + bar_width, y_tracker + tracker_height)
-                    new_page.draw_rect(rect, color=barcode_color, fill=barcode_color)
-                x_pos += bar_width + space
-            
-            # Overlay original PDF page content on top (preserving vector)
-            # Use show_pdf_page to insert the original page on top of background
-            new_page.show_pdf_page(fitz.Rect(0, 0, page_rect.width, page_rect.height), doc, page_num)
-            
-            # Save the new PDF page
-            new_doc.save(temp_pdf)
-            new_doc.close()
-            temp_files.append(temp_pdf)
-            
-            # Update CSV
-            rows[selected_index]['entity'] = f"{os.path.basename(output_path)}_page_{page_num + 1}"
-            rows[selected_index]['state'] = 'active'
-            
-            signed_pages.append((page_num + 1, selected_uuid, temp_pdf))
+    # Free rows from the last recorded pointer on; pages take them in turn
+    free_rows = _free_rows(rows, csv_entry['next_free'])
+    assignments = []
+    # Assign each page its UUID and template
+    for page_num in range(num_pages):
+        # Take the next available UUID
+        selected_index = next(free_rows, None)
+        if selected_index is None:
+            print(f"Warning: No more UUIDs available for page {page_num + 1}")
+            break
+        selected_uuid = rows[selected_index][_UUID_COL]
         
-        # Merge all PDF pages back together
-        merged_doc = fitz.open()
-        for page_num, uuid, temp_pdf_path in signed_pages:
-            page_doc = fitz.open(temp_pdf_path)
-            merged_doc.insert_pdf(page_doc)
-            page_doc.close()
+        # Select the correct template file based on even/odd page numbers
+        # Odd pages (1, 3, 5...) → calibration_page-coloured-1.svg (which has "page 1")
+        # Even pages (0, 2, 4...) → calibration_page-coloured-0.svg (which has "page 0")
+        if page_num % 2 == 1:  # Odd page (1-indexed: 1, 3, 5...)
+            page_template_path = 'calibration_page-coloured-1.svg'
+            template_page_label = "page 1"
+        else:  # Even page (0-indexed: 0, 2, 4...)
+            page_template_path = 'calibration_page-coloured-0.svg'
+            template_page_label = "page 0"
+        
+        # Check if the page-specific template exists, fallback to default template
+        if not os.path.exists(page_template_path):
+            if os.path.exists(template_svg_path):
+                page_template_path = template_svg_path
+            else:
+                raise FileNotFoundError(f"Template SVG not found: {page_template_path} or {template_svg_path}")
         
-        # Save merged PDF
-        merged_doc.save(output_path)
-        merged_doc.close()
+        tasks.append((page_num, selected_uuid, page_template_path, template_page_label))
         
-        # Write back to CSV
-        with open(csv_path, 'w', encoding='utf-8', newline='') as f:
-            fieldnames = ['uuid', 'entity', 'state']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
+        # CSV update, applied once the signed PDF is saved
+        assignments.append((selected_index, f"{os.path.basename(output_path)}_page_{page_num + 1}"))
         
-    finally:
-        # Clean up temporary files
-        for temp_file in temp_files:
-            try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            except Exception as e:
-                print(f"Warning: Could not remove temp file {temp_file}: {e}")
+        signed_pages.append((page_num + 1, selected_uuid))
+    
+    # Pages are independent, so build them in a process pool; each worker
+    # opens the source PDF once and caches its own parsed templates.
+    # Signed pages come back as PDF bytes and are merged in page order as
+    # they arrive, with no temporary files. In-process, each page's document
+    # is merged directly without a round trip through bytes
+    merged_doc = fitz.open()
+    if workers == 1:
+        _init_sign_worker(pdf_path)
+        try:
+            for task in tasks:
+                with _build_signed_page(task) as page_doc:
+                    merged_doc.insert_pdf(page_doc)
+        finally:
+            _worker_doc.close()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sign_worker,
+                                 initargs=(pdf_path,)) as executor:
+            for page_pdf in executor.map(_sign_page, tasks):
+                _append_pdf_bytes(merged_doc, page_pdf)
+    
+    # Save merged PDF
+    merged_doc.save(output_path)
+    merged_doc.close()
     
-    doc.close()
+    # Update and write back the CSV
+    for selected_index, entity in assignments:
+        rows[selected_index][_ENTITY_COL] = entity
+        rows[selected_index][_STATE_COL] = 'active'
+        csv_entry['next_free'] = selected_index + 1
+        csv_entry['pending'] += 1
+    _flush_uuid_rows(csv_path)
     
     return (output_path, signed_pages)
 
@@ -898,24 +1080,19 @@ def sign_with_next_uuid(csv_path, input_svg_path, output_filename=None, output_d
     
     Returns:
         tuple: (uuid, output_path) or None if no available UUID found
+    
+    The parsed CSV is reused across calls while the file is unchanged; the
+    allocation is written back before returning.
     """
-    # Read the CSV file
-    rows = []
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-    
-    # Find the next available UUID (empty entity and state)
-    selected_uuid = None
-    selected_index = None
-    for i, row in enumerate(rows):
-        if not row.get('entity', '').strip() and not row.get('state', '').strip():
-            selected_uuid = row['uuid']
-            selected_index = i
-            break
+    # Read the CSV file, or reuse this process's copy
+    csv_entry = _cached_uuid_rows(csv_path)
+    rows = csv_entry['rows']
     
-    if selected_uuid is None:
+    # Find the next available UUID (empty entity and state), starting from the recorded pointer
+    selected_index = next(_free_rows(rows, csv_entry['next_free']), None)
+    if selected_index is None:
         return None
+    selected_uuid = rows[selected_index][_UUID_COL]
     
     # Remove hyphens from UUID for barcode encoding
     uuid_for_barcode = selected_uuid.replace('-', '')
@@ -934,15 +1111,14 @@ def sign_with_next_uuid(csv_path, input_svg_path, output_filename=None, output_d
     
     # Update the CSV (store just the filename, not the full path)
     output_filename_with_ext = f"{output_filename}.svg"
-    rows[selected_index]['entity'] = output_filename_with_ext
-    rows[selected_index]['state'] = 'active'
+    rows[selected_index][_ENTITY_COL] = output_filename_with_ext
+    rows[selected_index][_STATE_COL] = 'active'
     
-    # Write back to CSV
-    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
-        fieldnames = ['uuid', 'entity', 'state']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+    csv_entry['next_free'] = selected_index + 1
+    csv_entry['pending'] += 1
+    
+    # Write back to CSV now, so the UUID can't be handed out again
+    _flush_uuid_rows(csv_path)
     
     return (selected_uuid, output_path)
 
@@ -1048,6 +1224,12 @@ Examples:
         help='Output path for signed PDF (default: input name with _signed suffix)'
     )
     
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Worker processes for --pdf pages (default: CPU count; 1 runs in-process)'
+    )
+    
     args = parser.parse_args()
     
     try:
@@ -1066,11 +1248,12 @@ Examples:
                 csv_path=args.csv,
                 output_path=args.pdf_output,
                 output_dir=args.output_dir,
-                template_svg_path=args.input
+                template_svg_path=args.input,
+                workers=args.workers
             )
             
             print(f"✓ Processed {len(signed_pages)} pages:")
-            for page_num, uuid, _ in signed_pages:
+            for page_num, uuid in signed_pages:
                 print(f"  Page {page_num}: UUID {uuid}")
             print(f"✓ Merged PDF saved to: {output_path}")
             print(f"✓ CSV updated with {len(signed_pages)} UUIDs")
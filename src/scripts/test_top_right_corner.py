@@ -6,13 +6,27 @@ Testing/inference script for top-right corner detection model.
 
 import os
 import sys
+import copy
+import math
+import contextlib
 import cv2
 import json
 import numpy as np
 import torch
+import torch.nn.functional as F
+from torch.utils.data import Dataset, DataLoader
 import argparse
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Add FieldChartOCR to path
 script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
@@ -20,29 +34,134 @@ fieldchart_dir = os.path.join(project_root, "FieldChartOCR")
 sys.path.insert(0, fieldchart_dir)
 
 from config import system_configs
-from utils import crop_image
 from db.datasets import datasets
 from nnet.py_factory import NetworkFactory
 
+# Inputs are padded to a few fixed sizes (below), so cuDNN's per-shape
+# algorithm search runs once per bucket rather than once per image size
+torch.backends.cudnn.benchmark = True
+# Let Ampere+ GPUs run fp32 convs/matmuls on TF32 tensor cores (torch >= 1.7)
+if hasattr(torch.backends.cudnn, "allow_tf32"):
+    torch.backends.cudnn.allow_tf32 = True
+    torch.backends.cuda.matmul.allow_tf32 = True
+
+# Allowed input heights/widths (each 127 mod 128, as the network expects);
+# larger images fall back to the next multiple of 128
+_INPUT_BUCKETS = (511, 767, 1023, 1279, 1535, 2047)
+
+def _input_size(size):
+    for bucket in _INPUT_BUCKETS:
+        if size <= bucket:
+            return bucket
+    return size | 127
+
 def _rescale_points(dets, ratios, borders, sizes):
-    xs, ys = dets[:, :, 2], dets[:, :, 3]
-    xs    /= ratios[0, 1]
-    ys    /= ratios[0, 0]
-    xs    -= borders[0, 2]
-    ys    -= borders[0, 0]
-    np.clip(xs, 0, sizes[0, 1], out=xs)
-    np.clip(ys, 0, sizes[0, 0], out=ys)
+    # dets is a (K, batch, fields) tensor; per-image values broadcast along the
+    # batch axis, and x/y (fields 2 and 3) are updated together as one view
+    xys = dets[:, :, 2:4]
+    xys.div_(ratios[:, [1, 0]]).sub_(borders[:, [2, 0]]).clamp_(min=0)
+    xys.copy_(torch.min(xys, sizes[:, [1, 0]]))
+
+def _autocast():
+    """FP16 autocast for the CUDA forward (torch >= 1.6); a no-op elsewhere."""
+    if not torch.cuda.is_available():
+        return contextlib.nullcontext()
+    if hasattr(torch, "autocast"):
+        return torch.autocast("cuda", dtype=torch.float16)
+    if hasattr(torch.cuda, "amp") and hasattr(torch.cuda.amp, "autocast"):
+        return torch.cuda.amp.autocast()
+    return contextlib.nullcontext()
+
+# inference_mode (torch >= 1.9) also skips autograd's version-counter bookkeeping
+_inference_mode = getattr(torch, "inference_mode", torch.no_grad)
 
-def kp_decode(nnet, images, K, ae_threshold=0.5, kernel=3):
-    with torch.no_grad():
-        detections, time_backbone, time_psn = nnet.test([images], ae_threshold=ae_threshold, K=K, kernel=kernel)
+def kp_decode(nnet, images, K, ae_threshold=0.5, kernel=3, corner_only=True):
+    # Only the first (tl) head locates the top-right corner; with corner_only
+    # the br head is not decoded and detections_br comes back as None
+    if hasattr(torch, "channels_last"):
+        images = images.contiguous(memory_format=torch.channels_last)
+    with _inference_mode(), _autocast():
+        detections, time_backbone, time_psn = nnet.test([images], ae_threshold=ae_threshold, K=K, kernel=kernel,
+                                                        corner_only=corner_only)
         detections_tl = detections[0]
         detections_br = detections[1]
-        detections_tl = detections_tl.data.cpu().numpy().transpose((2, 1, 0))
-        detections_br = detections_br.data.cpu().numpy().transpose((2, 1, 0))
+        # Stay on the device as (K, batch, fields); only the filtered points are copied back
+        detections_tl = detections_tl.data.float().permute(2, 1, 0)
+        if detections_br is not None:
+            detections_br = detections_br.data.float().permute(2, 1, 0)
         return detections_tl, detections_br, True
 
-def kp_detection(image, db, nnet, debug=False, decode_func=kp_decode, cuda_id=0):
+def _keep_mask(dets, max_per_image):
+    """
+    Mask of the (K, batch) detections to keep: positive scores only, and at
+    most max_per_image per image (ties with the last kept score are kept).
+    """
+    scores = dets[:, :, 0]
+    keep = scores > 0
+    if scores.size(0) > max_per_image:
+        scores = scores.masked_fill(scores <= 0, float("-inf"))
+        thresh = scores.topk(max_per_image, dim=0)[0][-1]
+        keep = keep & (scores >= thresh)
+    return keep
+
+def _top_points(dets_tl, dets_br, categories, max_per_image):
+    """
+    Filter a batch of detections on the device and split each image's
+    surviving points by category.
+    
+    Returns a list with one (top_points_tl, top_points_br) pair per image;
+    without br detections (corner_only decode) top_points_br has empty arrays.
+    """
+    if dets_br is None:
+        dets_br = dets_tl[:0]
+    keep_tl = _keep_mask(dets_tl, max_per_image).cpu().numpy().astype(bool)
+    keep_br = _keep_mask(dets_br, max_per_image).cpu().numpy().astype(bool)
+    dets_tl = dets_tl.cpu().numpy()
+    dets_br = dets_br.cpu().numpy()
+    
+    batch_points = []
+    for b in range(dets_tl.shape[1]):
+        detections_point_tl = dets_tl[keep_tl[:, b], b]
+        detections_point_br = dets_br[keep_br[:, b], b]
+        
+        batch_points.append((_split_by_class(detections_point_tl, categories),
+                             _split_by_class(detections_point_br, categories)))
+    return batch_points
+
+def _split_by_class(points, categories):
+    """Group points by their class column into {j + 1: points} with one stable sort."""
+    points = points[np.argsort(points[:, 1], kind="stable")].astype(np.float32)
+    starts = np.searchsorted(points[:, 1], np.arange(categories + 1))
+    return {j + 1: points[starts[j]:starts[j + 1]] for j in range(categories)}
+
+def _crop_slices(center, size, im_height, im_width):
+    """
+    Source and target slices plus border, matching utils.crop_image, for
+    placing an image centred at center into a canvas of the given size.
+    """
+    cty, ctx      = center
+    height, width = size
+    
+    x0, x1 = max(0, ctx - width // 2), min(ctx + width // 2, im_width)
+    y0, y1 = max(0, cty - height // 2), min(cty + height // 2, im_height)
+    
+    left, right = ctx - x0, x1 - ctx
+    top, bottom = cty - y0, y1 - cty
+    
+    cropped_cty, cropped_ctx = height // 2, width // 2
+    src = (slice(y0, y1), slice(x0, x1))
+    dst = (slice(cropped_cty - top, cropped_cty + bottom), slice(cropped_ctx - left, cropped_ctx + right))
+    border = [cropped_cty - top, cropped_cty + bottom, cropped_ctx - left, cropped_ctx + right]
+    return src, dst, border
+
+@_inference_mode()
+def kp_detection_batch(batch_images, db, nnet, debug=False, decode_func=kp_decode, cuda_id=0):
+    """
+    Detect corners in several images with a single forward pass.
+    
+    The images are centred in one zero-padded input sized for the largest of
+    them (rounded up to an input bucket); returns a list with one (top_points_tl, top_points_br) pair per image.
+    """
     K = db.configs["top_k"]
     ae_threshold = db.configs["ae_threshold"]
     nms_kernel = db.configs["nms_kernel"]
@@ -51,88 +170,77 @@ def kp_detection(image, db, nnet, debug=False, decode_func=kp_decode, cuda_id=0)
     nms_threshold = db.configs["nms_threshold"]
     max_per_image = db.configs["max_per_image"]
     
-    height, width = image.shape[0:2]
-    
-    detections_point_tl = []
-    detections_point_br = []
+    batch_size = len(batch_images)
     scale = 1.0
-    new_height = int(height * scale)
-    new_width  = int(width * scale)
-    new_center = np.array([new_height // 2, new_width // 2])
     
-    inp_height = new_height | 127
-    inp_width  = new_width  | 127
-    images  = np.zeros((1, 3, inp_height, inp_width), dtype=np.float32)
-    ratios  = np.zeros((1, 2), dtype=np.float32)
-    borders = np.zeros((1, 4), dtype=np.float32)
-    sizes   = np.zeros((1, 2), dtype=np.float32)
+    inp_height = _input_size(max(int(image.shape[0] * scale) for image in batch_images) | 127)
+    inp_width  = _input_size(max(int(image.shape[1] * scale) for image in batch_images) | 127)
+    ratios  = np.zeros((batch_size, 2), dtype=np.float32)
+    borders = np.zeros((batch_size, 4), dtype=np.float32)
+    sizes   = np.zeros((batch_size, 2), dtype=np.float32)
     
     out_height, out_width = (inp_height + 1) // 4, (inp_width + 1) // 4
     height_ratio = out_height / inp_height
     width_ratio  = out_width  / inp_width
     
-    resized_image = cv2.resize(image, (new_width, new_height))
-    resized_image, border, offset = crop_image(resized_image, new_center, [inp_height, inp_width])
-    
-    resized_image = resized_image / 255.
+    # Preprocess on the device: upload each raw uint8 image once, then
+    # normalize, resize and pad it into the batch there
+    device = torch.device("cuda", cuda_id) if torch.cuda.is_available() else torch.device("cpu")
+    images = torch.zeros((batch_size, 3, inp_height, inp_width), dtype=torch.float32, device=device)
     
-    images[0]  = resized_image.transpose((2, 0, 1))
-    borders[0] = border
-    sizes[0]   = [int(height * scale), int(width * scale)]
-    ratios[0]  = [height_ratio, width_ratio]
-    
-    if torch.cuda.is_available():
-        images = torch.from_numpy(images).cuda(cuda_id)
-    else:
-        images = torch.from_numpy(images)
+    for b, image in enumerate(batch_images):
+        height, width = image.shape[0:2]
+        new_height = int(height * scale)
+        new_width  = int(width * scale)
+        new_center = [new_height // 2, new_width // 2]
+        
+        if isinstance(image, np.ndarray):
+            image = torch.from_numpy(image)
+        if device.type == "cuda":
+            if not image.is_pinned():
+                image = image.pin_memory()
+            image = image.to(device, non_blocking=True)
+        image = image.permute(2, 0, 1).float().div_(255.)
+        if (new_height, new_width) != (height, width):
+            image = F.interpolate(image.unsqueeze(0), size=(new_height, new_width),
+                                  mode="bilinear", align_corners=False)[0]
+        
+        src, dst, border = _crop_slices(new_center, [inp_height, inp_width], new_height, new_width)
+        images[b, :, dst[0], dst[1]] = image[:, src[0], src[1]]
+        borders[b] = border
+        sizes[b]   = [new_height, new_width]
+        ratios[b]  = [height_ratio, width_ratio]
     
     dets_tl, dets_br, flag = decode_func(nnet, images, K, ae_threshold=ae_threshold, kernel=nms_kernel)
+    ratios  = torch.from_numpy(ratios).to(dets_tl.device)
+    borders = torch.from_numpy(borders).to(dets_tl.device)
+    sizes   = torch.from_numpy(sizes).to(dets_tl.device)
     _rescale_points(dets_tl, ratios, borders, sizes)
-    _rescale_points(dets_br, ratios, borders, sizes)
-    
-    detections_point_tl.append(dets_tl)
-    detections_point_br.append(dets_br)
-    detections_point_tl = np.concatenate(detections_point_tl, axis=1)
-    detections_point_br = np.concatenate(detections_point_br, axis=1)
-    
-    classes_p_tl = detections_point_tl[:, 0, 1]
-    classes_p_br = detections_point_br[:, 0, 1]
-    
-    # Reject detections with negative scores
-    keep_inds_p = (detections_point_tl[:, 0, 0] > 0)
-    detections_point_tl = detections_point_tl[keep_inds_p, 0]
-    classes_p_tl = classes_p_tl[keep_inds_p]
-    
-    keep_inds_p = (detections_point_br[:, 0, 0] > 0)
-    detections_point_br = detections_point_br[keep_inds_p, 0]
-    classes_p_br = classes_p_br[keep_inds_p]
-    
-    top_points_tl = {}
-    top_points_br = {}
-    for j in range(categories):
-        keep_inds_p = (classes_p_tl == j)
-        top_points_tl[j + 1] = detections_point_tl[keep_inds_p].astype(np.float32)
-        keep_inds_p = (classes_p_br == j)
-        top_points_br[j + 1] = detections_point_br[keep_inds_p].astype(np.float32)
-    
-    # Filter by max_per_image
-    scores = np.hstack([top_points_tl[j][:, 0] for j in range(1, categories + 1)])
-    if len(scores) > max_per_image:
-        kth = len(scores) - max_per_image
-        thresh = np.partition(scores, kth)[kth]
-        for j in range(1, categories + 1):
-            keep_inds = (top_points_tl[j][:, 0] >= thresh)
-            top_points_tl[j] = top_points_tl[j][keep_inds]
-    
-    scores = np.hstack([top_points_br[j][:, 0] for j in range(1, categories + 1)])
-    if len(scores) > max_per_image:
-        kth = len(scores) - max_per_image
-        thresh = np.partition(scores, kth)[kth]
-        for j in range(1, categories + 1):
-            keep_inds = (top_points_br[j][:, 0] >= thresh)
-            top_points_br[j] = top_points_br[j][keep_inds]
-    
-    return top_points_tl, top_points_br
+    if dets_br is not None:
+        _rescale_points(dets_br, ratios, borders, sizes)
+    
+    return _top_points(dets_tl, dets_br, categories, max_per_image)
+
+def kp_detection(image, db, nnet, debug=False, decode_func=kp_decode, cuda_id=0):
+    return kp_detection_batch([image], db, nnet, debug=debug, decode_func=decode_func, cuda_id=cuda_id)[0]
+
+class ChartTestDataset(Dataset):
+    """Test images read in DataLoader workers as raw uint8 HWC tensors (None if unreadable)."""
+    def __init__(self, db):
+        self._db = db
+    
+    def __len__(self):
+        return len(self._db.db_inds)
+    
+    def __getitem__(self, db_ind):
+        image_file = self._db.image_file(db_ind)
+        image = cv2.imread(image_file)
+        if image is not None:
+            image = torch.from_numpy(image)
+        return db_ind, image_file, image
+
+def _collate_list(batch):
+    return batch
 
 def visualize_detection(image, detections_tl, detections_br, output_path=None):
     """Visualize detected corners on image."""
@@ -152,31 +260,51 @@ def visualize_detection(image, detections_tl, detections_br, output_path=None):
     
     return vis_image
 
+@lru_cache(maxsize=None)
+def _load_cfg(cfg_path):
+    with open(cfg_path, "r") as f:
+        return json.load(f)
+
+_network_cache = {}
+
+def _load_network(cfg_path, test_iter, data_dir, cache_dir, test_split, configs):
+    """
+    Build the test dataset and the eval-mode network, reusing both when
+    test_model is called again in the same process with the same settings.
+    """
+    key = (cfg_path, test_iter, data_dir, cache_dir, test_split)
+    if key not in _network_cache:
+        # Load dataset
+        dataset = system_configs.dataset
+        test_db = datasets[dataset](configs["db"], test_split)
+        
+        # Load model
+        print("Loading model...")
+        nnet = NetworkFactory(test_db)
+        nnet.load_params(test_iter)
+        nnet.cuda()
+        nnet.channels_last()
+        nnet.eval_mode()
+        _network_cache[key] = (test_db, nnet)
+    return _network_cache[key]
+
 def test_model(cfg_file, test_iter, data_dir, cache_dir, test_split="valchart", 
-               output_dir=None, visualize=True):
+               output_dir=None, visualize=True, batch_size=8, num_workers=2):
     """Test the trained model."""
-    os.chdir(fieldchart_dir)
-    
-    # Load config
-    cfg_path = os.path.join(system_configs.config_dir, cfg_file + ".json")
-    with open(cfg_path, "r") as f:
-        import json
-        configs = json.load(f)
-    
-    configs["system"]["data_dir"] = data_dir
-    configs["system"]["cache_dir"] = cache_dir
+    # Load config; relative paths resolve against FieldChartOCR, as they would
+    # when running from that directory
+    cfg_path = os.path.join(fieldchart_dir, system_configs.config_dir, cfg_file + ".json")
+    configs = copy.deepcopy(_load_cfg(cfg_path))
+    
+    configs["system"]["data_dir"] = os.path.join(fieldchart_dir, data_dir)
+    configs["system"]["cache_dir"] = os.path.join(fieldchart_dir, cache_dir)
+    configs["system"]["result_dir"] = os.path.join(
+        fieldchart_dir, configs["system"].get("result_dir", system_configs.full["result_dir"]))
     system_configs.update_config(configs["system"])
+    if output_dir:
+        output_dir = os.path.join(fieldchart_dir, output_dir)
     
-    # Load dataset
-    dataset = system_configs.dataset
-    test_db = datasets[dataset](configs["db"], test_split)
-    
-    # Load model
-    print("Loading model...")
-    nnet = NetworkFactory(test_db)
-    nnet.load_params(test_iter)
-    nnet.cuda()
-    nnet.eval_mode()
+    test_db, nnet = _load_network(cfg_path, test_iter, data_dir, cache_dir, test_split, configs)
     
     print(f"Testing on {len(test_db.db_inds)} images...")
     
@@ -190,58 +318,74 @@ def test_model(cfg_file, test_iter, data_dir, cache_dir, test_split="valchart",
     correct = 0
     total = 0
     
-    for db_ind in range(len(test_db.db_inds)):
-        image_file = test_db.image_file(db_ind)
-        image = cv2.imread(image_file)
+    # Encode/write visualizations in the background, keeping a bounded
+    # number of images in flight so memory does not grow with the test set
+    viz_pool = ThreadPoolExecutor(max_workers=2) if visualize and output_dir else None
+    viz_pending = deque()
+    
+    # Read images in background workers so decoding overlaps inference;
+    # batches come back pinned, ready for non-blocking upload
+    loader = DataLoader(ChartTestDataset(test_db), batch_size=batch_size, shuffle=False,
+                        num_workers=num_workers, pin_memory=torch.cuda.is_available(),
+                        collate_fn=_collate_list)
+    for loaded in loader:
+        batch = []
+        for db_ind, image_file, image in loaded:
+            if image is None:
+                print(f"Warning: Could not load {image_file}")
+                continue
+            batch.append((db_ind, image_file, image))
         
-        if image is None:
-            print(f"Warning: Could not load {image_file}")
+        if not batch:
             continue
+        batch_detections = kp_detection_batch([image for _, _, image in batch], test_db, nnet)
         
-        # Get ground truth
-        gt_detections = test_db.detections(db_ind)
-        
-        # Run detection
-        detections_tl, detections_br = kp_detection(image, test_db, nnet)
-        
-        # Evaluate (simple distance-based metric)
-        if len(gt_detections) > 0:
-            gt_point = gt_detections[0]  # [x1, y1, x2, y2, category]
-            gt_x = (gt_point[0] + gt_point[2]) / 2
-            gt_y = (gt_point[1] + gt_point[3]) / 2
+        for (db_ind, image_file, image), (detections_tl, detections_br) in zip(batch, batch_detections):
+            # Get ground truth
+            gt_detections = test_db.detections(db_ind)
             
-            # Get best detection
-            best_det = None
-            best_score = 0
-            for cat_id, points in detections_tl.items():
-                for point in points:
-                    if point[0] > best_score:
-                        best_score = point[0]
-                        best_det = point
+            # Evaluate (simple distance-based metric)
+            if len(gt_detections) > 0:
+                gt_point = gt_detections[0]  # [x1, y1, x2, y2, category]
+                gt_x = float(gt_point[0] + gt_point[2]) / 2
+                gt_y = float(gt_point[1] + gt_point[3]) / 2
             
-            if best_det is not None:
-                pred_x, pred_y = best_det[2], best_det[3]
-                distance = np.sqrt((pred_x - gt_x)**2 + (pred_y - gt_y)**2)
+                # Get best detection (highest score across all categories)
+                best_det = None
+                all_points = np.concatenate(list(detections_tl.values()), axis=0)
+                if len(all_points):
+                    best_ind = all_points[:, 0].argmax()
+                    if all_points[best_ind, 0] > 0:
+                        best_det = all_points[best_ind].tolist()
+            
+                if best_det is not None:
+                    best_score, pred_x, pred_y = best_det[0], best_det[2], best_det[3]
+                    distance = math.hypot(pred_x - gt_x, pred_y - gt_y)
                 
-                # Consider correct if within 20 pixels
-                if distance < 20:
-                    correct += 1
-                total += 1
+                    # Consider correct if within 20 pixels
+                    if distance < 20:
+                        correct += 1
+                    total += 1
                 
-                results.append({
-                    'image': os.path.basename(image_file),
-                    'gt': (gt_x, gt_y),
-                    'pred': (pred_x, pred_y),
-                    'distance': distance,
-                    'score': best_score,
-                    'correct': distance < 20
-                })
-        
-        # Visualize
-        if visualize and output_dir:
-            vis_image = visualize_detection(image, detections_tl, detections_br)
-            output_path = os.path.join(vis_dir, os.path.basename(image_file))
-            cv2.imwrite(output_path, vis_image)
+                    results.append({
+                        'image': os.path.basename(image_file),
+                        'gt': (gt_x, gt_y),
+                        'pred': (pred_x, pred_y),
+                        'distance': distance,
+                        'score': best_score,
+                        'correct': distance < 20
+                    })
+            
+            # Visualize
+            if visualize and output_dir:
+                vis_image = visualize_detection(image.numpy(), detections_tl, detections_br)
+                output_path = os.path.join(vis_dir, os.path.basename(image_file))
+                viz_pending.append(viz_pool.submit(cv2.imwrite, output_path, vis_image))
+                while len(viz_pending) > 2 * batch_size:
+                    viz_pending.popleft().result()
+    
+    if viz_pool is not None:
+        viz_pool.shutdown(wait=True)
     
     # Print results
     print("\n" + "=" * 50)
@@ -258,8 +402,12 @@ def test_model(cfg_file, test_iter, data_dir, cache_dir, test_split="valchart",
     # Save results
     if output_dir:
         results_file = os.path.join(output_dir, "test_results.json")
-        with open(results_file, 'w') as f:
-            json.dump(results, f, indent=2)
+        if HAS_ORJSON:
+            with open(results_file, 'wb') as f:
+                f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(results_file, 'w') as f:
+                json.dump(results, f, indent=2)
         print(f"\nResults saved to: {results_file}")
         if visualize:
             print(f"Visualizations saved to: {vis_dir}")
@@ -280,6 +428,10 @@ def main():
                        help="Output directory for results")
     parser.add_argument("--no_visualize", action="store_true",
                        help="Don't save visualizations")
+    parser.add_argument("--batch_size", type=int, default=8,
+                       help="Number of images per forward pass")
+    parser.add_argument("--num_workers", type=int, default=2,
+                       help="Image loading workers (1-4 is usually enough)")
     
     args = parser.parse_args()
     
@@ -314,7 +466,8 @@ def main():
             return
     
     test_model(args.cfg_file, args.test_iter, args.data_dir, args.cache_dir,
-               args.test_split, args.output_dir, not args.no_visualize)
+               args.test_split, args.output_dir, not args.no_visualize, args.batch_size,
+               args.num_workers)
 
 if __name__ == "__main__":
     main()
@@ -10,7 +10,6 @@ Usage:
 
 import os
 import sys
-import subprocess
 
 if __name__ == "__main__":
     import argparse
@@ -47,21 +46,12 @@ if __name__ == "__main__":
     print(f"Starting from iteration: {args.start_iter}")
     print("=" * 50)
     
-    # Build command to run train_chart.py
-    train_script = os.path.join(fieldchart_dir, "train_chart.py")
-    cmd = [
-        sys.executable,
-        train_script,
-        "--cfg_file", args.cfg_file,
-        "--iter", str(args.start_iter),
-        "--threads", str(args.threads),
-        "--data_dir", args.data_dir,
-        "--cache_path", args.cache_path
-    ]
-    
-    # Change to FieldChartOCR directory and run
+    # Run train_chart in this process rather than spawning a second interpreter;
+    # its config and cache paths are relative to the FieldChartOCR directory
+    sys.path.insert(0, fieldchart_dir)
     os.chdir(fieldchart_dir)
     try:
-        subprocess.run(cmd, check=True)
+        from train_chart import main as train_main
+        train_main(args)
     finally:
         os.chdir(repo_root)
@@ -9,6 +9,25 @@ import json
 import cv2
 import numpy as np
 from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Rows covered by the info text drawn at the top of the display
+INFO_BAND_HEIGHT = 100
+# Ring radius + line thickness of the corner marker
+MARKER_EXTENT = 12
+
+@lru_cache(maxsize=16)
+def _read_bgr(image_path):
+    # Cached so flipping back and forth does not re-decode; callers must not
+    # draw on the returned array
+    return cv2.imread(image_path)
 
 class AnnotationVerifier:
     def __init__(self, annotations_file, image_dir, output_file):
@@ -28,6 +47,9 @@ class AnnotationVerifier:
         self.current_image = None
         self.current_image_file = None
         self.current_point = None
+        self._base_display = None
+        self._base_key = None
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=1)
         self.window_name = "Corner Verification - Press 'h' for help"
         
         # Mouse callback state
@@ -53,11 +75,17 @@ class AnnotationVerifier:
         self.current_image_file = self.image_files[index]
         image_path = os.path.join(self.image_dir, self.current_image_file)
         
-        self.current_image = cv2.imread(image_path)
+        self.current_image = _read_bgr(image_path)
+        self._base_display = None
         if self.current_image is None:
             print(f"Warning: Could not load {self.current_image_file}")
             return False
         
+        # Decode the next image while this one is being reviewed
+        if index + 1 < len(self.image_files):
+            self._prefetch_executor.submit(
+                _read_bgr, os.path.join(self.image_dir, self.image_files[index + 1]))
+        
         # Get current annotation
         ann = self.annotations.get(self.current_image_file, {})
         if ann.get('x') is not None and ann.get('y') is not None:
@@ -80,19 +108,46 @@ class AnnotationVerifier:
         if self.current_image is None:
             return
         
-        display_image = self.current_image.copy()
-        
-        # Draw current point
-        point_to_draw = self.mouse_point if self.mouse_point else self.current_point
-        if point_to_draw:
-            cv2.circle(display_image, point_to_draw, 10, (0, 255, 0), 2)
-            cv2.circle(display_image, point_to_draw, 3, (0, 255, 0), -1)
-        
-        # Draw confidence info
         ann = self.annotations.get(self.current_image_file, {})
         confidence = ann.get('confidence', 0.0)
         needs_review = ann.get('needs_review', False)
+        point_to_draw = self.mouse_point if self.mouse_point else self.current_point
         
+        if point_to_draw and point_to_draw[1] - MARKER_EXTENT < INFO_BAND_HEIGHT:
+            # The info text is drawn over the marker here, so redraw everything
+            display_image = self.current_image.copy()
+            self._draw_marker(display_image, point_to_draw)
+            self._draw_info(display_image, confidence, needs_review)
+            cv2.imshow(self.window_name, display_image)
+            return
+        
+        # Reuse the image with its info text, and only touch the marker's
+        # neighbourhood, restoring it once the frame has been shown
+        base_key = (confidence, needs_review)
+        if self._base_display is None or self._base_key != base_key:
+            self._base_display = self.current_image.copy()
+            self._draw_info(self._base_display, confidence, needs_review)
+            self._base_key = base_key
+        
+        if not point_to_draw:
+            cv2.imshow(self.window_name, self._base_display)
+            return
+        
+        x, y = point_to_draw
+        height, width = self._base_display.shape[:2]
+        x0, x1 = min(max(x - MARKER_EXTENT, 0), width), min(max(x + MARKER_EXTENT + 1, 0), width)
+        y0, y1 = min(max(y - MARKER_EXTENT, 0), height), min(max(y + MARKER_EXTENT + 1, 0), height)
+        saved = self._base_display[y0:y1, x0:x1].copy()
+        self._draw_marker(self._base_display, point_to_draw)
+        cv2.imshow(self.window_name, self._base_display)
+        self._base_display[y0:y1, x0:x1] = saved
+    
+    def _draw_marker(self, image, point):
+        cv2.circle(image, point, 10, (0, 255, 0), 2)
+        cv2.circle(image, point, 3, (0, 255, 0), -1)
+    
+    def _draw_info(self, display_image, confidence, needs_review):
+        """Draw the image counter, confidence and review flag."""
         info_text = f"Image {self.current_index + 1}/{len(self.image_files)}: {self.current_image_file}"
         cv2.putText(display_image, info_text, (10, 30), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
@@ -105,8 +160,6 @@ class AnnotationVerifier:
         if needs_review:
             cv2.putText(display_image, "NEEDS REVIEW", (10, 90), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-        
-        cv2.imshow(self.window_name, display_image)
     
     def save_annotations(self):
         """Save updated annotations to output file."""
@@ -125,8 +178,16 @@ class AnnotationVerifier:
                 ann['needs_review'] = True
             self.annotations[self.current_image_file] = ann
         
-        with open(self.output_file, 'w') as f:
-            json.dump(self.annotations, f, indent=2)
+        # Write to a temporary file and swap it in, so an interrupted save
+        # never leaves a truncated output file behind
+        tmp_file = self.output_file + '.tmp'
+        if HAS_ORJSON:
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(self.annotations, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_file, 'w') as f:
+                json.dump(self.annotations, f, indent=2)
+        os.replace(tmp_file, self.output_file)
         print(f"\nAnnotations saved to {self.output_file}")
     
     def run(self):
@@ -209,6 +270,7 @@ class AnnotationVerifier:
                 print("  's': Save and exit")
                 print("  'q': Quit without saving")
         
+        self._prefetch_executor.shutdown(wait=False)
         cv2.destroyAllWindows()
 
 def main():
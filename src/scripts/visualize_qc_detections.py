@@ -9,16 +9,102 @@ appear as a non-square, indicating normalization is needed.
 """
 
 import os
+import io
 import json
 import time
+import atexit
+from functools import lru_cache
 import cv2
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image
 from tqdm import tqdm
 
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _TJ = TurboJPEG()
+    HAS_TURBOJPEG = True
+except (ImportError, OSError):
+    # OSError: the Python binding is installed but libturbojpeg is not
+    HAS_TURBOJPEG = False
+
+EXIF_ORIENTATION = 0x0112
+
+_IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+_JPEG_EXTS = ('.jpg', '.jpeg')
+# Annotated copies are for review, not archival, so trade some quality for
+# encode time; optimized Huffman tables and progressive scans stay off
+_JPEG_QUALITY = 85
+_JPEG_WRITE_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, _JPEG_QUALITY,
+                      cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+                      cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+
+# Images decoded ahead of, and queued for encoding behind, the drawing loop
+# when annotating in-process
+_IO_DEPTH = 4
+
+# Annotation files above this size are stream-parsed instead of loaded whole
+_STREAM_THRESHOLD_BYTES = 100 * 1024 * 1024
+
 # Physical dimensions constants
 QC_SQUARE_SIZE_MM = 6 * 0.975  # 6 cells × 0.975mm = 5.85mm
 PAGE_HEIGHT_MM = 279.4  # US Letter: 11 inches = 279.4mm
 PAGE_WIDTH_MM = 215.9   # US Letter: 8.5 inches = 215.9mm
 
+# #region agent log
+# Debug logging is off unless FCOCR_DEBUG=1, so entries are not even built;
+# FCOCR_DEBUG_LOG redirects the log away from the original workstation path
+_DEBUG = os.environ.get("FCOCR_DEBUG") == "1"
+_DEBUG_LOG_PATH = os.environ.get(
+    "FCOCR_DEBUG_LOG",
+    r'c:\Users\lenovo\Documents\ucboulder\msds\dtsa-5506\.cursor\debug.log')
+_debug_log = None
+_debug_log_buffering = 1 << 16
+_LOG_HEADER = b'{"sessionId":"debug-session","runId":"run1",'
+
+def _emit(hypothesis_id, location, message, data):
+    """Append one debug-log entry; the log is opened once and written in 64 KB chunks."""
+    global _debug_log
+    if _debug_log is None:
+        try:
+            _debug_log = open(_DEBUG_LOG_PATH, 'ab', buffering=_debug_log_buffering)
+        except Exception:
+            _debug_log = False
+        else:
+            atexit.register(_debug_log.close)
+    if not _debug_log:
+        return
+    try:
+        log_entry = {
+            "hypothesisId": hypothesis_id,
+            "location": location,
+            "message": message,
+            "data": data,
+            "timestamp": int(time.time() * 1000)
+        }
+        # The session fields never change, so they are serialized once in
+        # _LOG_HEADER and the rest of the object is appended after its '{'
+        if HAS_ORJSON:
+            _debug_log.write(_LOG_HEADER + orjson.dumps(log_entry)[1:] + b'\n')
+        else:
+            _debug_log.write(_LOG_HEADER + (json.dumps(log_entry, separators=(',', ':'))[1:] + '\n').encode())
+    except Exception:
+        pass
+# #endregion
+
 def calculate_qc_rectangle_size(image_height, image_width):
     """
     Calculate QC square rectangle size in pixels based on physical dimensions.
@@ -31,63 +117,53 @@ def calculate_qc_rectangle_size(image_height, image_width):
         (width_pixels, height_pixels) tuple
     """
     # #region agent log
-    log_path = r'c:\Users\lenovo\Documents\ucboulder\msds\dtsa-5506\.cursor\debug.log'
-    try:
-        with open(log_path, 'a') as f:
-            log_entry = {
-                "sessionId": "debug-session",
-                "runId": "run1",
-                "hypothesisId": "B",
-                "location": "visualize_qc_detections.py:calculate_qc_rectangle_size:entry",
-                "message": "Calculating QC rectangle size",
-                "data": {
-                    "image_height": image_height,
-                    "image_width": image_width,
-                    "qc_square_size_mm": QC_SQUARE_SIZE_MM,
-                    "page_height_mm": PAGE_HEIGHT_MM,
-                    "page_width_mm": PAGE_WIDTH_MM
-                },
-                "timestamp": int(time.time() * 1000)
-            }
-            f.write(json.dumps(log_entry) + '\n')
-    except Exception:
-        pass
+    if _DEBUG:
+        _emit("B", "visualize_qc_detections.py:calculate_qc_rectangle_size:entry", "Calculating QC rectangle size", {
+            "image_height": image_height,
+            "image_width": image_width,
+            "qc_square_size_mm": QC_SQUARE_SIZE_MM,
+            "page_height_mm": PAGE_HEIGHT_MM,
+            "page_width_mm": PAGE_WIDTH_MM
+        })
+    # #endregion
+    
+    qc_width, qc_height = _qc_rectangle_size(image_height, image_width)
+    
+    # #region agent log
+    if _DEBUG:
+        scale_height = PAGE_HEIGHT_MM / image_height
+        scale_width = PAGE_WIDTH_MM / image_width
+        _emit("B", "visualize_qc_detections.py:calculate_qc_rectangle_size:calculated", "QC rectangle size calculated", {
+            "scale_height": scale_height,
+            "scale_width": scale_width,
+            "qc_square_height_pixels": QC_SQUARE_SIZE_MM / scale_height,
+            "qc_square_width_pixels": QC_SQUARE_SIZE_MM / scale_width,
+            "qc_width_int": qc_width,
+            "qc_height_int": qc_height
+        })
     # #endregion
     
+    return qc_width, qc_height
+
+# Scans from one pipeline nearly all share a size, so this is usually a hit
+@lru_cache(maxsize=64)
+def _qc_rectangle_size(image_height, image_width):
+    """Logging-free core of calculate_qc_rectangle_size."""
     # Calculate scale factors (mm per pixel)
     scale_height = PAGE_HEIGHT_MM / image_height
     scale_width = PAGE_WIDTH_MM / image_width
     
-    # Calculate QC square size in pixels
+    # Calculate QC square size in pixels. Keep the division order: the
+    # algebraically equal QC_SQUARE_SIZE_MM * width / PAGE_WIDTH_MM rounds
+    # differently at exact DPI multiples and would move some rectangles by 1px
     qc_square_height_pixels = QC_SQUARE_SIZE_MM / scale_height
     qc_square_width_pixels = QC_SQUARE_SIZE_MM / scale_width
     
-    # #region agent log
-    try:
-        with open(log_path, 'a') as f:
-            log_entry = {
-                "sessionId": "debug-session",
-                "runId": "run1",
-                "hypothesisId": "B",
-                "location": "visualize_qc_detections.py:calculate_qc_rectangle_size:calculated",
-                "message": "QC rectangle size calculated",
-                "data": {
-                    "scale_height": scale_height,
-                    "scale_width": scale_width,
-                    "qc_square_height_pixels": qc_square_height_pixels,
-                    "qc_square_width_pixels": qc_square_width_pixels,
-                    "qc_width_int": int(qc_square_width_pixels),
-                    "qc_height_int": int(qc_square_height_pixels)
-                },
-                "timestamp": int(time.time() * 1000)
-            }
-            f.write(json.dumps(log_entry) + '\n')
-    except Exception:
-        pass
-    # #endregion
-    
     return int(qc_square_width_pixels), int(qc_square_height_pixels)
 
+# Red - low (< 0.5), orange - medium (< 0.8), green - high confidence
+_CONFIDENCE_COLORS = ((0, 0, 255), (0, 165, 255), (0, 255, 0))
+
 def get_confidence_color(confidence):
     """
     Get color based on confidence level.
@@ -98,12 +174,8 @@ def get_confidence_color(confidence):
     Returns:
         (B, G, R) color tuple for OpenCV
     """
-    if confidence >= 0.8:
-        return (0, 255, 0)  # Green - high confidence
-    elif confidence >= 0.5:
-        return (0, 165, 255)  # Orange - medium confidence
-    else:
-        return (0, 0, 255)  # Red - low confidence
+    # Each threshold passed adds one, indexing red / orange / green
+    return _CONFIDENCE_COLORS[int(confidence >= 0.5) + int(confidence >= 0.8)]
 
 def draw_qc_detection(image, x, y, width, height, confidence):
     """
@@ -118,59 +190,38 @@ def draw_qc_detection(image, x, y, width, height, confidence):
         confidence: Confidence value for color coding
     """
     # #region agent log
-    log_path = r'c:\Users\lenovo\Documents\ucboulder\msds\dtsa-5506\.cursor\debug.log'
-    try:
-        with open(log_path, 'a') as f:
-            log_entry = {
-                "sessionId": "debug-session",
-                "runId": "run1",
-                "hypothesisId": "A",
-                "location": "visualize_qc_detections.py:draw_qc_detection:entry",
-                "message": "Drawing QC detection rectangle",
-                "data": {
-                    "x": x,
-                    "y": y,
-                    "width": width,
-                    "height": height,
-                    "confidence": confidence,
-                    "image_shape": list(image.shape) if image is not None else None
-                },
-                "timestamp": int(time.time() * 1000)
-            }
-            f.write(json.dumps(log_entry) + '\n')
-    except Exception:
-        pass
+    if _DEBUG:
+        _emit("A", "visualize_qc_detections.py:draw_qc_detection:entry", "Drawing QC detection rectangle", {
+            "x": x,
+            "y": y,
+            "width": width,
+            "height": height,
+            "confidence": confidence,
+            "image_shape": list(image.shape) if image is not None else None
+        })
     # #endregion
     
+    # Work in whole pixels from here on
+    x = int(x)
+    y = int(y)
+    
     # Calculate rectangle corners (centered at x, y)
-    half_width = width // 2
-    half_height = height // 2
+    half_width = width >> 1
+    half_height = height >> 1
     
-    pt1 = (int(x - half_width), int(y - half_height))
-    pt2 = (int(x + half_width), int(y + half_height))
+    pt1 = (x - half_width, y - half_height)
+    pt2 = (x + half_width, y + half_height)
     
     # #region agent log
-    try:
-        with open(log_path, 'a') as f:
-            log_entry = {
-                "sessionId": "debug-session",
-                "runId": "run1",
-                "hypothesisId": "A",
-                "location": "visualize_qc_detections.py:draw_qc_detection:corners",
-                "message": "Rectangle corners calculated",
-                "data": {
-                    "pt1": list(pt1),
-                    "pt2": list(pt2),
-                    "half_width": half_width,
-                    "half_height": half_height,
-                    "actual_width": pt2[0] - pt1[0],
-                    "actual_height": pt2[1] - pt1[1]
-                },
-                "timestamp": int(time.time() * 1000)
-            }
-            f.write(json.dumps(log_entry) + '\n')
-    except Exception:
-        pass
+    if _DEBUG:
+        _emit("A", "visualize_qc_detections.py:draw_qc_detection:corners", "Rectangle corners calculated", {
+            "pt1": list(pt1),
+            "pt2": list(pt2),
+            "half_width": half_width,
+            "half_height": half_height,
+            "actual_width": pt2[0] - pt1[0],
+            "actual_height": pt2[1] - pt1[1]
+        })
     # #endregion
     
     # Get color based on confidence
@@ -180,220 +231,369 @@ def draw_qc_detection(image, x, y, width, height, confidence):
     cv2.rectangle(image, pt1, pt2, color, 2)
     
     # Draw center point
-    cv2.circle(image, (int(x), int(y)), 5, color, -1)
+    cv2.circle(image, (x, y), 5, color, -1)
     
-    # Draw confidence text
+    _draw_confidence_label(image, x, y, half_width, half_height, confidence, color)
+
+def _draw_confidence_label(image, x, y, half_width, half_height, confidence, color):
+    """Draw the confidence value beside a detection rectangle, kept inside the image."""
     conf_text = f"{confidence:.2f}"
-    text_size = cv2.getTextSize(conf_text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
-    text_x = int(x + half_width + 10)
-    text_y = int(y - half_height)
+    text_width, text_height = cv2.getTextSize(conf_text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
+    text_x = x + half_width + 10
+    text_y = y - half_height
     
     # Ensure text stays within image bounds
-    if text_x + text_size[0] > image.shape[1]:
-        text_x = int(x - half_width - text_size[0] - 10)
-    if text_y < text_size[1]:
-        text_y = int(y + half_height + text_size[1] + 10)
+    if text_x + text_width > image.shape[1]:
+        text_x = x - half_width - text_width - 10
+    if text_y < text_height:
+        text_y = y + half_height + text_height + 10
     
     # Draw text with background for readability
     cv2.rectangle(image, 
-                  (text_x - 2, text_y - text_size[1] - 2),
-                  (text_x + text_size[0] + 2, text_y + 2),
+                  (text_x - 2, text_y - text_height - 2),
+                  (text_x + text_width + 2, text_y + 2),
                   (0, 0, 0), -1)
     cv2.putText(image, conf_text, (text_x, text_y),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
 
-def visualize_detections(annotations_file, image_dir, output_suffix="_annotated"):
+def draw_qc_detections_batch(image, xs, ys, widths, heights, confidences):
     """
-    Visualize QC square detections on images.
+    Draw QC square detection rectangles for many detections on one image.
+    
+    Rectangles are drawn with one cv2.drawContours call per confidence color;
+    center points and labels are then drawn on top of all of them.
+    
+    Args:
+        image: Image to draw on (will be modified)
+        xs: X coordinates of detection centers
+        ys: Y coordinates of detection centers
+        widths: Widths of rectangles in pixels
+        heights: Heights of rectangles in pixels
+        confidences: Confidence values for color coding
+    """
+    if len(xs) == 1:
+        draw_qc_detection(image, xs[0], ys[0], widths[0], heights[0], confidences[0])
+        return
+    
+    # #region agent log
+    if _DEBUG:
+        _emit("A", "visualize_qc_detections.py:draw_qc_detections_batch:entry", "Drawing QC detection rectangles", {
+            "count": len(xs),
+            "image_shape": list(image.shape) if image is not None else None
+        })
+    # #endregion
+    
+    # Whole pixels, truncated like the int() casts in draw_qc_detection
+    xs = np.asarray(xs).astype(np.int32)
+    ys = np.asarray(ys).astype(np.int32)
+    half_widths = np.asarray(widths, dtype=np.int32) >> 1
+    half_heights = np.asarray(heights, dtype=np.int32) >> 1
+    confidences = np.asarray(confidences, dtype=np.float64)
+    
+    # (N, 4, 1, 2) corner contours
+    x0 = xs - half_widths
+    y0 = ys - half_heights
+    x1 = xs + half_widths
+    y1 = ys + half_heights
+    contours = np.stack([np.stack([x0, y0], axis=-1), np.stack([x1, y0], axis=-1),
+                         np.stack([x1, y1], axis=-1), np.stack([x0, y1], axis=-1)],
+                        axis=1)[:, :, None, :]
+    
+    # Same bucketing as get_confidence_color
+    buckets = (confidences >= 0.5).astype(np.intp) + (confidences >= 0.8)
+    for bucket, color in enumerate(_CONFIDENCE_COLORS):
+        mask = buckets == bucket
+        if mask.any():
+            cv2.drawContours(image, list(contours[mask]), -1, color, 2)
+    
+    for x, y, half_width, half_height, confidence, bucket in zip(
+            xs.tolist(), ys.tolist(), half_widths.tolist(), half_heights.tolist(),
+            confidences.tolist(), buckets.tolist()):
+        color = _CONFIDENCE_COLORS[bucket]
+        cv2.circle(image, (x, y), 5, color, -1)
+        _draw_confidence_label(image, x, y, half_width, half_height, confidence, color)
+
+def _exif_orientation(data):
+    """EXIF orientation of an encoded image, read from its header only; 1 if absent or unreadable."""
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            return im.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return 1
+
+def _cv2_decode(data):
+    """Decode encoded image bytes as cv2.imread would; None on failure."""
+    try:
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        # imdecode raises on an empty buffer where imread returns None
+        return None
+
+def _read_image(image_path):
+    """Load a BGR image, decoding JPEGs with turbojpeg when available; None on failure."""
+    if HAS_TURBOJPEG and image_path.lower().endswith(_JPEG_EXTS):
+        try:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        # turbojpeg ignores EXIF orientation but cv2 applies it, and the
+        # annotation coordinates come from cv2-decoded images; rotated
+        # photos are decoded by cv2 from the bytes already read
+        if _exif_orientation(data) != 1:
+            return _cv2_decode(data)
+        try:
+            return _TJ.decode(data, pixel_format=TJPF_BGR)
+        except Exception:
+            # libturbojpeg rejects files cv2 still reads, such as CMYK/YCCK
+            # JPEGs or PNGs saved with a .jpg name
+            return _cv2_decode(data)
+    return cv2.imread(image_path)
+
+def _write_image(output_path, image):
+    """Save a BGR image, encoding JPEGs with turbojpeg when available."""
+    if not output_path.lower().endswith(_JPEG_EXTS):
+        # PNG keeps OpenCV's default compression level, already its fastest
+        cv2.imwrite(output_path, image)
+    elif HAS_TURBOJPEG:
+        with open(output_path, 'wb') as f:
+            f.write(_TJ.encode(image, quality=_JPEG_QUALITY, pixel_format=TJPF_BGR))
+    else:
+        cv2.imwrite(output_path, image, _JPEG_WRITE_PARAMS)
+
+def _load_annotations(annotations_file, image_files):
+    """
+    Load the annotations for image_files from the top-level JSON object.
+    
+    Large files are streamed with ijson so only the wanted records are kept;
+    otherwise the whole file is parsed, with orjson when available.
     
     Args:
         annotations_file: Path to JSON file with annotations
-        image_dir: Directory containing images
-        output_suffix: Suffix to add to output filenames
+        image_files: Image filenames whose annotations are needed
+    
+    Returns:
+        Dict mapping image filename to annotation, for those that have one
     """
-    # Load annotations
-    with open(annotations_file, 'r') as f:
-        annotations = json.load(f)
+    wanted = set(image_files)
+    if HAS_IJSON and os.path.getsize(annotations_file) > _STREAM_THRESHOLD_BYTES:
+        with open(annotations_file, 'rb') as f:
+            return {k: v for k, v in ijson.kvitems(f, '', use_float=True) if k in wanted}
+    
+    if HAS_ORJSON:
+        with open(annotations_file, 'rb') as f:
+            annotations = orjson.loads(f.read())
+    else:
+        with open(annotations_file, 'r') as f:
+            annotations = json.load(f)
+    # Drop the rest before the per-image work starts
+    return {k: annotations[k] for k in wanted if k in annotations}
+
+def _is_up_to_date(output_path, image_path, annotations_mtime):
+    """True if output_path exists and is newer than its source image and the annotations."""
+    try:
+        output_mtime = os.stat(output_path).st_mtime
+    except OSError:
+        return False
+    return output_mtime >= max(os.stat(image_path).st_mtime, annotations_mtime)
+
+def _init_worker():
+    """Give each worker its own unbuffered debug-log handle."""
+    global _debug_log, _debug_log_buffering
+    # Each entry is then a single O_APPEND write, so lines from different
+    # workers cannot interleave
+    _debug_log = None
+    _debug_log_buffering = 0
+
+def _process_one(task, read=_read_image, write=_write_image):
+    """
+    Draw the QC rectangle for one image and save the annotated copy.
     
-    # Get all image files
-    image_files = [f for f in os.listdir(image_dir) 
-                   if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    Args:
+        task: (image_file, annotation, image_path, output_path) tuple
+        read: Called with image_path to load the image (None on failure)
+        write: Called with (output_path, image) to save the annotated copy
     
-    # Filter out already annotated images and distorted images
-    image_files = [f for f in image_files 
-                   if output_suffix not in f and '_distorted' not in f]
+    Returns:
+        True if the annotated image was written, False if it was skipped
+    """
+    image_file, annotation, image_path, output_path = task
     
-    print(f"Processing {len(image_files)} images...")
+    if annotation is None:
+        print(f"Warning: No annotation found for {image_file}")
+        return False
     
-    processed_count = 0
-    skipped_count = 0
+    x = annotation.get('x')
+    y = annotation.get('y')
+    confidence = annotation.get('confidence', 0.0)
     
-    for image_file in tqdm(image_files):
-        # Get annotation for this image
-        annotation = annotations.get(image_file)
-        
-        if annotation is None:
-            print(f"Warning: No annotation found for {image_file}")
-            skipped_count += 1
-            continue
-        
-        x = annotation.get('x')
-        y = annotation.get('y')
-        confidence = annotation.get('confidence', 0.0)
-        
-        # Skip if no valid coordinates
-        if x is None or y is None:
-            print(f"Warning: Invalid coordinates for {image_file}")
-            skipped_count += 1
-            continue
-        
-        # Load image
-        image_path = os.path.join(image_dir, image_file)
-        image = cv2.imread(image_path)
-        
-        if image is None:
-            print(f"Warning: Could not load {image_file}")
-            skipped_count += 1
-            continue
-        
-        # Get image dimensions
-        image_height, image_width = image.shape[:2]
+    # Skip if no valid coordinates
+    if x is None or y is None:
+        print(f"Warning: Invalid coordinates for {image_file}")
+        return False
+    
+    # Load image
+    image = read(image_path)
+    
+    if image is None:
+        print(f"Warning: Could not load {image_file}")
+        return False
+    
+    # Get image dimensions
+    image_height, image_width = image.shape[:2]
+    
+    # #region agent log
+    if _DEBUG:
+        _emit("C", "visualize_qc_detections.py:visualize_detections:before_calc", "Before calculating QC rectangle", {
+            "image_file": image_file,
+            "image_height": image_height,
+            "image_width": image_width,
+            "detection_x": x,
+            "detection_y": y,
+            "confidence": confidence
+        })
+    # #endregion
+    
+    # Check if coordinates are outside image bounds (indicating cropped image)
+    is_cropped_image = (x < 0 or x >= image_width or y < 0 or y >= image_height)
+    
+    if is_cropped_image:
+        # For cropped images, center the annotation and use most of the image
+        # The cropped image IS the QC square, so we want to draw a rectangle
+        # that covers most of it (with some margin)
+        margin_ratio = 0.1  # 10% margin on each side
+        qc_width = int(image_width * (1 - 2 * margin_ratio))
+        qc_height = int(image_height * (1 - 2 * margin_ratio))
+        center_x = image_width // 2
+        center_y = image_height // 2
         
         # #region agent log
-        log_path = r'c:\Users\lenovo\Documents\ucboulder\msds\dtsa-5506\.cursor\debug.log'
-        try:
-            with open(log_path, 'a') as f:
-                log_entry = {
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                    "hypothesisId": "C",
-                    "location": "visualize_qc_detections.py:visualize_detections:before_calc",
-                    "message": "Before calculating QC rectangle",
-                    "data": {
-                        "image_file": image_file,
-                        "image_height": image_height,
-                        "image_width": image_width,
-                        "detection_x": x,
-                        "detection_y": y,
-                        "confidence": confidence
-                    },
-                    "timestamp": int(time.time() * 1000)
-                }
-                f.write(json.dumps(log_entry) + '\n')
-        except Exception:
-            pass
+        if _DEBUG:
+            _emit("D", "visualize_qc_detections.py:visualize_detections:cropped_image", "Detected cropped image, centering annotation", {
+                "image_file": image_file,
+                "original_x": x,
+                "original_y": y,
+                "centered_x": center_x,
+                "centered_y": center_y,
+                "qc_width": qc_width,
+                "qc_height": qc_height
+            })
         # #endregion
         
-        # Check if coordinates are outside image bounds (indicating cropped image)
-        is_cropped_image = (x < 0 or x >= image_width or y < 0 or y >= image_height)
-        
-        if is_cropped_image:
-            # For cropped images, center the annotation and use most of the image
-            # The cropped image IS the QC square, so we want to draw a rectangle
-            # that covers most of it (with some margin)
-            margin_ratio = 0.1  # 10% margin on each side
-            qc_width = int(image_width * (1 - 2 * margin_ratio))
-            qc_height = int(image_height * (1 - 2 * margin_ratio))
-            center_x = image_width // 2
-            center_y = image_height // 2
-            
-            # #region agent log
-            try:
-                with open(log_path, 'a') as f:
-                    log_entry = {
-                        "sessionId": "debug-session",
-                        "runId": "run1",
-                        "hypothesisId": "D",
-                        "location": "visualize_qc_detections.py:visualize_detections:cropped_image",
-                        "message": "Detected cropped image, centering annotation",
-                        "data": {
-                            "image_file": image_file,
-                            "original_x": x,
-                            "original_y": y,
-                            "centered_x": center_x,
-                            "centered_y": center_y,
-                            "qc_width": qc_width,
-                            "qc_height": qc_height
-                        },
-                        "timestamp": int(time.time() * 1000)
-                    }
-                    f.write(json.dumps(log_entry) + '\n')
-            except Exception:
-                pass
-            # #endregion
-            
-            x, y = center_x, center_y
-        else:
-            # For full page images, calculate QC square size from physical dimensions
-            qc_width, qc_height = calculate_qc_rectangle_size(image_height, image_width)
-        
-        # #region agent log
-        try:
-            with open(log_path, 'a') as f:
-                log_entry = {
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                    "hypothesisId": "C",
-                    "location": "visualize_qc_detections.py:visualize_detections:after_calc",
-                    "message": "After calculating QC rectangle",
-                    "data": {
-                        "image_file": image_file,
-                        "qc_width": qc_width,
-                        "qc_height": qc_height,
-                        "final_x": x,
-                        "final_y": y,
-                        "is_cropped": is_cropped_image
-                    },
-                    "timestamp": int(time.time() * 1000)
-                }
-                f.write(json.dumps(log_entry) + '\n')
-        except Exception:
-            pass
-        # #endregion
+        x, y = center_x, center_y
+    else:
+        # For full page images, calculate QC square size from physical dimensions
+        qc_width, qc_height = calculate_qc_rectangle_size(image_height, image_width)
+    
+    # #region agent log
+    if _DEBUG:
+        _emit("C", "visualize_qc_detections.py:visualize_detections:after_calc", "After calculating QC rectangle", {
+            "image_file": image_file,
+            "qc_width": qc_width,
+            "qc_height": qc_height,
+            "final_x": x,
+            "final_y": y,
+            "is_cropped": is_cropped_image
+        })
+    # #endregion
+    
+    # Draw detection
+    draw_qc_detection(image, x, y, qc_width, qc_height, confidence)
+    
+    # Save annotated image
+    write(output_path, image)
+    return True
+
+def _annotate_in_process(tasks):
+    """
+    Run _process_one over tasks on this thread, overlapping image I/O with drawing.
+    
+    Decoding runs _IO_DEPTH images ahead and encoding trails behind, each in a
+    small thread pool; the codecs release the GIL while they work.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=2) as read_pool, \
+            ThreadPoolExecutor(max_workers=2) as write_pool:
+        reads = deque(read_pool.submit(_read_image, task[2]) for task in tasks[:_IO_DEPTH])
+        writes = deque()
         
-        # Draw detection
-        draw_qc_detection(image, x, y, qc_width, qc_height, confidence)
+        def write(output_path, image):
+            writes.append(write_pool.submit(_write_image, output_path, image))
+            while len(writes) > _IO_DEPTH:
+                writes.popleft().result()
         
-        # Save annotated image
-        base_name = os.path.splitext(image_file)[0]
-        ext = os.path.splitext(image_file)[1]
-        output_filename = f"{base_name}{output_suffix}{ext}"
-        output_path = os.path.join(image_dir, output_filename)
+        for i, task in enumerate(tqdm(tasks)):
+            image_future = reads.popleft()
+            if i + _IO_DEPTH < len(tasks):
+                reads.append(read_pool.submit(_read_image, tasks[i + _IO_DEPTH][2]))
+            results.append(_process_one(task, read=lambda _: image_future.result(), write=write))
         
-        cv2.imwrite(output_path, image)
-        processed_count += 1
+        # Surface any encode errors before reporting
+        for future in writes:
+            future.result()
+    return results
+
+def visualize_detections(annotations_file, image_dir, output_suffix="_annotated", workers=None,
+                         force=False):
+    """
+    Visualize QC square detections on images.
+    
+    Args:
+        annotations_file: Path to JSON file with annotations
+        image_dir: Directory containing images
+        output_suffix: Suffix to add to output filenames
+        workers: Number of worker processes (default: CPU count; 1 runs in-process)
+        force: Re-annotate images even if their annotated copy is up to date
+    """
+    # Get all image files, skipping already annotated and distorted images
+    image_files = [f for f in os.listdir(image_dir)
+                   if f.lower().endswith(_IMAGE_EXTS)
+                   and output_suffix not in f and '_distorted' not in f]
+    
+    # Load annotations for just those images
+    annotations = _load_annotations(annotations_file, image_files)
+    
+    # Images are independent, so annotate them in a process pool; each task
+    # carries its input and output paths, built on one joined directory prefix
+    dir_prefix = os.path.join(image_dir, '')
+    annotations_mtime = os.stat(annotations_file).st_mtime
+    tasks = []
+    up_to_date_count = 0
+    for image_file in image_files:
+        base_name, ext = os.path.splitext(image_file)
+        image_path = dir_prefix + image_file
+        output_path = f"{dir_prefix}{base_name}{output_suffix}{ext}"
+        # An annotated copy newer than both inputs would come out the same
+        if not force and _is_up_to_date(output_path, image_path, annotations_mtime):
+            up_to_date_count += 1
+            continue
+        tasks.append((image_file, annotations.get(image_file), image_path, output_path))
+    
+    print(f"Processing {len(tasks)} images ({up_to_date_count} already up to date)...")
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        results = _annotate_in_process(tasks)
+    else:
+        # Workers inherit the log handle; flush so they do not re-emit its buffer
+        if _DEBUG and _debug_log:
+            _debug_log.flush()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            results = list(tqdm(executor.map(_process_one, tasks, chunksize=8), total=len(tasks)))
+    
+    processed_count = sum(results)
+    skipped_count = len(results) - processed_count
     
     print(f"\nVisualization complete:")
     print(f"  Processed: {processed_count}")
     print(f"  Skipped: {skipped_count}")
+    print(f"  Up to date: {up_to_date_count}")
     print(f"  Output directory: {image_dir}")
 
 def main():
     import argparse
     
-    # #region agent log
-    log_path = r'c:\Users\lenovo\Documents\ucboulder\msds\dtsa-5506\.cursor\debug.log'
-    try:
-        with open(log_path, 'a') as f:
-            import json
-            import time
-            log_entry = {
-                "sessionId": "debug-session",
-                "runId": "run1",
-                "hypothesisId": "A",
-                "location": "visualize_qc_detections.py:main:entry",
-                "message": "main() function entry",
-                "data": {
-                    "cwd": os.getcwd(),
-                    "script_dir": os.path.dirname(os.path.abspath(__file__)) if '__file__' in globals() else "unknown"
-                },
-                "timestamp": int(time.time() * 1000)
-            }
-            f.write(json.dumps(log_entry) + '\n')
-    except Exception:
-        pass
-    # #endregion
-    
     parser = argparse.ArgumentParser(
         description='Visualize QC square detections with calculated-size rectangles'
     )
@@ -406,69 +606,46 @@ def main():
     parser.add_argument('--output_suffix', type=str,
                        default='_annotated',
                        help='Suffix to add to output filenames')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Worker processes (default: CPU count; 1 runs in-process)')
+    parser.add_argument('--force', action='store_true',
+                       help='Re-annotate images even if their annotated copy is newer than the inputs')
     
     args = parser.parse_args()
     
-    # #region agent log
-    try:
-        with open(log_path, 'a') as f:
-            log_entry = {
-                "sessionId": "debug-session",
-                "runId": "run1",
-                "hypothesisId": "B",
-                "location": "visualize_qc_detections.py:main:args_parsed",
-                "message": "Command line arguments parsed",
-                "data": {
-                    "annotations_arg": args.annotations,
-                    "image_dir_arg": args.image_dir,
-                    "cwd": os.getcwd()
-                },
-                "timestamp": int(time.time() * 1000)
-            }
-            f.write(json.dumps(log_entry) + '\n')
-    except Exception:
-        pass
-    # #endregion
-    
     # Convert relative paths to absolute
     annotations_file = os.path.abspath(args.annotations)
     image_dir = os.path.abspath(args.image_dir)
+    annotations_exists = os.path.exists(annotations_file)
+    image_dir_exists = os.path.exists(image_dir)
     
     # #region agent log
-    try:
-        with open(log_path, 'a') as f:
-            log_entry = {
-                "sessionId": "debug-session",
-                "runId": "run1",
-                "hypothesisId": "C",
-                "location": "visualize_qc_detections.py:main:paths_resolved",
-                "message": "Paths resolved to absolute",
-                "data": {
-                    "annotations_file": annotations_file,
-                    "image_dir": image_dir,
-                    "annotations_exists": os.path.exists(annotations_file),
-                    "image_dir_exists": os.path.exists(image_dir)
-                },
-                "timestamp": int(time.time() * 1000)
-            }
-            f.write(json.dumps(log_entry) + '\n')
-    except Exception:
-        pass
+    if _DEBUG:
+        _emit("A", "visualize_qc_detections.py:main:entry", "Arguments parsed and paths resolved", {
+            "cwd": os.getcwd(),
+            "script_dir": os.path.dirname(os.path.abspath(__file__)) if '__file__' in globals() else "unknown",
+            "annotations_arg": args.annotations,
+            "image_dir_arg": args.image_dir,
+            "annotations_file": annotations_file,
+            "image_dir": image_dir,
+            "annotations_exists": annotations_exists,
+            "image_dir_exists": image_dir_exists
+        })
     # #endregion
     
-    if not os.path.exists(annotations_file):
+    if not annotations_exists:
         print(f"Error: Annotations file not found: {annotations_file}")
         print(f"Current working directory: {os.getcwd()}")
         print(f"Tried to resolve: {args.annotations}")
         return
     
-    if not os.path.exists(image_dir):
+    if not image_dir_exists:
         print(f"Error: Image directory not found: {image_dir}")
         print(f"Current working directory: {os.getcwd()}")
         print(f"Tried to resolve: {args.image_dir}")
         return
     
-    visualize_detections(annotations_file, image_dir, args.output_suffix)
+    visualize_detections(annotations_file, image_dir, args.output_suffix, args.workers, args.force)
 
 if __name__ == '__main__':
     main()